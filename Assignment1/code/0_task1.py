@@ -7,8 +7,16 @@ Created on Wed 09 20 09:30:47 2023
 
 import pandas as pd
 from utils.validate import time_window_is_correct
-from utils.preprocess import clean_raw_bike
+from utils.preprocess import (clean_raw_bike, clean_station, read_raw_bike,
+                              merging_bike_station, save_preprocessed,
+                              PREPROCESSED_BIKE_OPTIONS,
+                              PREPROCESSED_STATION_OPTIONS)
+from utils.cache import read_csv_cached
+from utils.profile import profile_columns
 from config.global_vars import Project_Configs
+from utils.instrument import stage
+
+STATION_COLUMNS = ("from_station_id", "to_station_id")
 
 
 # NOTE Task 1.1
@@ -26,7 +34,8 @@ def count_valid_trips(cleaned_bike: pd.DataFrame, date: str = None):
     # if time windows unmatched, raise exception.
     if date:
         time_window_is_correct(cleaned_bike, date)
-    valid_trips_number = len(cleaned_bike["trip_id"].unique())
+    valid_trips_number = profile_columns(cleaned_bike,
+                                         ["trip_id"]).at["trip_id", "distinct"]
     return valid_trips_number
 
 
@@ -41,10 +50,10 @@ def count_used_stations(cleaned_bike: pd.DataFrame):
     Returns:
         _type_: the number of unique stations used in df.
     """
-    # set: remove duplicated data
-    used_stations_number = len(
-        set(cleaned_bike["from_station_id"].tolist())
-        | set(cleaned_bike["to_station_id"].tolist()))
+    # origins & destinations counted as one set of stations
+    used_stations_number = profile_columns(
+        cleaned_bike, [STATION_COLUMNS]).at["+".join(STATION_COLUMNS),
+                                             "distinct"]
     return used_stations_number
 
 
@@ -59,25 +68,52 @@ def unique_bikes_number(cleaned_bike: pd.DataFrame):
     Returns:
         _type_: number of unique bike
     """
-    unique_bikes_number = len(set(cleaned_bike["bikeid"].tolist()))
+    unique_bikes_number = profile_columns(cleaned_bike,
+                                          ["bikeid"]).at["bikeid", "distinct"]
     return unique_bikes_number
 
 
+def profile_task1(cleaned_bike: pd.DataFrame):
+    """Task 1.1 - 1.3 counters in one pass over the trips.
+
+    Args:
+        cleaned_bike (pd.DataFrame): cleaned bike trips record with fileds
+        <"trip_id","from_station_id","to_station_id","bikeid">
+
+    Returns:
+        _type_: (valid trips, used stations, unique bikes)
+    """
+    profile = profile_columns(cleaned_bike,
+                              ["trip_id", STATION_COLUMNS, "bikeid"])
+    return tuple(profile["distinct"].tolist())
+
+
+@stage
 def complete_task1():
-    raw_bike = pd.read_csv(Project_Configs.BIKE_DATA_PATH.value)
+    # only the columns & trips in the time window are read
+    raw_bike = read_raw_bike()
     cleaned_chicago_data = clean_raw_bike(raw_bike)
 
-    # use this if clean_bike already exist
-    # cleaned_chicago_data = pd.read_csv(Project_Configs.PREPROCESSED_BIKE.value)
+    # persist preprocessed data (csv + typed cache) for task 2-4
+    cleaned_station = clean_station(
+        read_csv_cached(Project_Configs.STATION_DATA_PATH.value))
+    save_preprocessed(
+        merging_bike_station(cleaned_chicago_data, cleaned_station),
+        Project_Configs.PREPROCESSED_BIKE.value, PREPROCESSED_BIKE_OPTIONS)
+    save_preprocessed(cleaned_station,
+                      Project_Configs.PREPROCESSED_STATION.value,
+                      PREPROCESSED_STATION_OPTIONS)
+    valid_trips, used_stations, unique_bikes = profile_task1(
+        cleaned_chicago_data)
     print(
         "\n==================================Task 1==================================\n"
     )
     print(f"the number of valid bicycle trips on 25 July 2019 is :\
-        {count_valid_trips(cleaned_chicago_data)}\n")
+        {valid_trips}\n")
     print(f"the number of bike stations used on 25 July 2019 is:\
-              {count_used_stations(cleaned_chicago_data)}\n")
+              {used_stations}\n")
     print(f"the number of unique bikes were used on 25 July 2019 is:\
-              {unique_bikes_number(cleaned_chicago_data)}\n")
+              {unique_bikes}\n")
 
 
 if __name__ == "__main__":
@@ -6,100 +6,76 @@ Created on Wed 09 20 09:30:54 2023
 '''
 
 import pandas as pd
-import geopandas as gpd
-from utils.preprocess import cal_distance_in_proj_coord
+from utils.preprocess import (cal_distance_in_proj_coord, convert_coordinate,
+                              load_preprocessed_bike)
+from utils.station import load_station_table
+from utils.statistic import describe_columns
+from utils.sketch import QuantileSketch
 from config.global_vars import Project_Configs
-
-
-# NOTE Task 2.1
-def convert_coordinate(cleaned_bike: pd.DataFrame,
-                       origin_epsg: int = None,
-                       target_epsg: int = None):
-    """generate from point(geometry) and to point(geometry) and transform epsg
-      using station lon&lat.
-
-    Args:
-        cleaned_bike (pd.DataFrame): bike data (merged with station location data)
-        origin_epsg (int, optional): origin epsg. Defaults to None.
-        target_epsg (int, optional): target epsg. Defaults to None.
-
-    Returns:
-        _type_: GeoDataframe with two geometry(from point & to point) per row.
-    """
-    cleaned_bike["from_point"] = gpd.points_from_xy(
-        cleaned_bike["lon_from"],
-        cleaned_bike["lat_from"],
-        crs=f"epsg:{origin_epsg}").to_crs(f"epsg:{target_epsg}")
-    cleaned_bike["to_point"] = gpd.points_from_xy(
-        cleaned_bike["lon_to"],
-        cleaned_bike["lat_to"],
-        crs=f"epsg:{origin_epsg}").to_crs(f"epsg:{target_epsg}")
-
-    bike_with_proj_geom = cleaned_bike.drop(
-        ["lon_from", "lat_from", "lon_to", "lat_to"], axis=1)
-    return bike_with_proj_geom
+from utils.instrument import stage
 
 
 # NOTE Task 2.2
-def bike_trip_statistic(df_bike: pd.DataFrame):
+@stage
+def bike_trip_statistic(df_bike: pd.DataFrame,
+                        percentiles=(0.25, 0.75),
+                        by: str = None,
+                        approximate: bool = False):
     """statistic bike trip data
 
     Args:
         df_bike (pd.DataFrame): dataframe to be describe
+        percentiles (tuple, optional): percentiles besides the median.
+        Defaults to (0.25, 0.75).
+        by (str, optional): field to group by, e.g. "from_station_id".
+        Defaults to None.
+        approximate (bool, optional): estimate median & percentiles with
+        QuantileSketch (utils/sketch.py) instead of sorting. Defaults to False.
+
+    Raises:
+        TypeError: approximate statistic per group is not supported
 
     Returns:
         statistic_info: two columns(trip_duration&trip_distance),7 records
-        (unique indices)
+        (unique indices), per group if by is given.
         _type_: dataframe
     """
     bike_with_dis = cal_distance_in_proj_coord(df_bike, "trip_distance")
     # column 'tripduration' is verified by calculating
     #  'end_time' minus 'start_time'.
     #  It's OK to use it directly.
-    bike_with_dis["tripduration"] = (
-        bike_with_dis["tripduration"].astype("float").astype("int"))
-    indices_trip_duration = [
-        bike_with_dis["tripduration"].max(),
-        bike_with_dis["tripduration"].min(),
-        bike_with_dis["tripduration"].median(),
-        bike_with_dis["tripduration"].mean(),
-        bike_with_dis["tripduration"].quantile(0.25),
-        bike_with_dis["tripduration"].quantile(0.75),
-        bike_with_dis["tripduration"].std(),
-    ]
-
-    indices_trip_distance = [
-        bike_with_dis["trip_distance"].max(),
-        bike_with_dis["trip_distance"].min(),
-        bike_with_dis["trip_distance"].median(),
-        bike_with_dis["trip_distance"].mean(),
-        bike_with_dis["trip_distance"].quantile(0.25),
-        bike_with_dis["trip_distance"].quantile(0.75),
-        bike_with_dis["trip_distance"].std(),
-    ]
-
-    statistic_info = pd.DataFrame(
-        data={
-            "trip_duration/s": indices_trip_duration,
-            "trip_distance/m": indices_trip_distance,
+    columns = ["tripduration", "trip_distance"]
+    if approximate:
+        if by is not None:
+            raise TypeError("Approximate statistic per group Not Supported.")
+        statistic_info = pd.DataFrame({
+            column: QuantileSketch.from_values(
+                bike_with_dis[column]).describe(percentiles)
+            for column in columns
+        })
+    else:
+        statistic_info = describe_columns(bike_with_dis,
+                                          columns,
+                                          percentiles=percentiles,
+                                          by=by)
+    statistic_info = statistic_info.rename(
+        {
+            "tripduration": "trip_duration/s",
+            "trip_distance": "trip_distance/m",
         },
-        index=[
-            "Max Value",
-            "Min Value",
-            "Median",
-            "Mean",
-            "25% Percentile",
-            "75% Percentile",
-            "Standard Deviation",
-        ],
+        axis=1,
     ).round(2)
     return statistic_info
 
 
+@stage
 def complete_task2():
-    cleaned_chicago_data = pd.read_csv(Project_Configs.PREPROCESSED_BIKE.value)
-    proj_coord_data = convert_coordinate(cleaned_chicago_data, 4326,
-                                         Project_Configs.PROJECT_CRS.value)
+    cleaned_chicago_data = load_preprocessed_bike()
+    # NOTE Task 2.1
+    proj_coord_data = convert_coordinate(cleaned_chicago_data,
+                                         4326,
+                                         Project_Configs.PROJECT_CRS.value,
+                                         station_table=load_station_table())
     statistic_info = bike_trip_statistic(proj_coord_data)
     print(
         "\n==================================Task 2==================================\n"
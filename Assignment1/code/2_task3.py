@@ -8,12 +8,17 @@ Created on Wed 09 20 09:31:00 2023
 from utils.customized_plot import (plot_trend, plot_kde,
                                    plot_departure_spatial_distribution,
                                    plot_arrival_spatial_distribution,
-                                   plot_boxplot)
-import pandas as pd
+                                   plot_boxplot, render_figures)
 from config.global_vars import Project_Configs
-from utils.preprocess import (clean_station, cal_distance_in_proj_coord,
-                              convert_coordinate)
+from utils.instrument import stage
+from utils.preprocess import (cal_distance_in_proj_coord, convert_coordinate,
+                              load_preprocessed_bike,
+                              load_preprocessed_station)
+from utils.station import load_station_table, build_station_context
+from utils.cube import load_trip_cube
 import geopandas as gpd
+import os
+import sys
 
 
 def pre_data_for_task_3():
@@ -25,21 +30,22 @@ def pre_data_for_task_3():
     Returns:
         _type_: bike,station,chicago_boundary
     """
-    cleaned_bike = pd.read_csv(Project_Configs.PREPROCESSED_BIKE.value)
-    cleaned_bike["start_time"] = pd.to_datetime(cleaned_bike["start_time"])
-    cleaned_bike["end_time"] = pd.to_datetime(cleaned_bike["end_time"])
-    cleaned_bike = convert_coordinate(cleaned_bike, 4326,
-                                      Project_Configs.PROJECT_CRS.value)
+    # typed cache: start_time/end_time already come back as datetime64
+    cleaned_bike = load_preprocessed_bike()
+    cleaned_bike = convert_coordinate(cleaned_bike,
+                                      4326,
+                                      Project_Configs.PROJECT_CRS.value,
+                                      station_table=load_station_table())
     cleaned_bike = cal_distance_in_proj_coord(cleaned_bike, "trip_distance")
-    station_data = clean_station(
-        pd.read_csv(Project_Configs.STATION_DATA_PATH.value))
+    station_data = load_preprocessed_station()
     chicago_base = gpd.read_file(Project_Configs.BASE_CHICAGO.value).to_crs(
         f"epsg:{Project_Configs.PROJECT_CRS.value}")
 
     return cleaned_bike, station_data, chicago_base
 
 
-def complete_task3():
+@stage
+def complete_task3(figure_dir: str = None):
     """task 3
     step1:plot line chart, showing the number flow by time
 
@@ -51,67 +57,72 @@ def complete_task3():
 
     step4: plot probability density for both trip distance and trip duration.
 
+    Args:
+        figure_dir (str, optional): if given, all figures are rendered
+        concurrently (headless) into this directory as png instead of being
+        shown one by one. Defaults to None.
     """
     cleaned_bike, cleaned_station, chicago_base = pre_data_for_task_3()
-    # task 3.1
-    plot_trend(cleaned_bike,
-               target_column="start_time",
-               emphasis_range=[(7, 9), (16, 18)])
-    # task 3.2.1
-    plot_departure_spatial_distribution(cleaned_bike, cleaned_station,
-                                        chicago_base)
-    # generate departure aggregation
-    depature_stations_number = cleaned_bike.groupby([
-        'from_station_id'
-    ]).count()[['trip_id']].rename({"trip_id": "departure_stations_count"},
-                                   axis=1)
-    cleaned_station['geometry'] = gpd.points_from_xy(
-        cleaned_station['lon'], cleaned_station['lat'],
-        crs="epsg:4326").to_crs("epsg:26916")
-    station_geom = cleaned_station.drop(['lon', 'lat'], axis=1)
-    depature_station_gdf = gpd.GeoDataFrame(
-        depature_stations_number.merge(station_geom,
-                                       left_index=True,
-                                       right_index=True))
-    # plot statistic info for departure aggregation
-    plot_boxplot(depature_station_gdf,
-                 field="departure_stations_count",
-                 xlabel="station_departure_count",
-                 ylabel="departure_station",
-                 title="distribution of station's departure counts")
-
-    # task 3.2.2
-    plot_arrival_spatial_distribution(cleaned_bike, cleaned_station,
-                                      chicago_base)
-
-    # generate arrival aggregation
-    arrival_stations_number = cleaned_bike.groupby(['to_station_id']).count()[[
-        'trip_id'
-    ]].rename({"trip_id": "arrival_stations_count"}, axis=1)
-    cleaned_station['geometry'] = gpd.points_from_xy(
-        cleaned_station['lon'], cleaned_station['lat'],
-        crs="epsg:4326").to_crs("epsg:26916")
-    station_geom = cleaned_station.drop(['lon', 'lat'], axis=1)
-
-    # plot statistic info for arrival aggregation
-    arrival_station_gdf = gpd.GeoDataFrame(
-        arrival_stations_number.merge(station_geom,
-                                      left_index=True,
-                                      right_index=True))
-
-    plot_boxplot(arrival_station_gdf,
-                 field="arrival_stations_count",
-                 xlabel="station_arrival_count",
-                 ylabel="arrival_station",
-                 title="distribution of station's arrival counts",
-                 color="coral")
-
-    # task 3.3
-    plot_kde(cleaned_bike, topic="distance")
-
-    # task 3.4
-    plot_kde(cleaned_bike, topic="duration")
+    # station x date x hour counts, built once and updated with new days,
+    # restricted to the dates of cleaned_bike
+    trip_cube = load_trip_cube(cleaned_bike)
+    # projected stations with departure & arrival counts, shared by 3.2.x
+    station_context = build_station_context(load_station_table(), trip_cube)
+    # each figure: (plot function, file name, args, kwargs)
+    figures = [
+        # task 3.1
+        (plot_trend, "3_1_trend.png", (cleaned_bike, ), {
+            "target_column": "start_time",
+            "emphasis_range": [(7, 9), (16, 18)],
+            "cube": trip_cube
+        }),
+        # task 3.2.1
+        (plot_departure_spatial_distribution, "3_2_1_departure.png",
+         (cleaned_bike, cleaned_station, chicago_base), {
+             "context": station_context
+         }),
+        # plot statistic info for departure aggregation
+        (plot_boxplot, "3_2_1_departure_boxplot.png",
+         (station_context.departure_gdf, ), {
+             "field": "departure_stations_count",
+             "xlabel": "station_departure_count",
+             "ylabel": "departure_station",
+             "title": "distribution of station's departure counts"
+         }),
+        # task 3.2.2
+        (plot_arrival_spatial_distribution, "3_2_2_arrival.png",
+         (cleaned_bike, cleaned_station, chicago_base), {
+             "context": station_context
+         }),
+        # plot statistic info for arrival aggregation
+        (plot_boxplot, "3_2_2_arrival_boxplot.png",
+         (station_context.arrival_gdf, ), {
+             "field": "arrival_stations_count",
+             "xlabel": "station_arrival_count",
+             "ylabel": "arrival_station",
+             "title": "distribution of station's arrival counts",
+             "color": "coral"
+         }),
+        # task 3.3
+        (plot_kde, "3_3_distance_kde.png", (cleaned_bike, ), {
+            "topic": "distance"
+        }),
+        # task 3.4
+        (plot_kde, "3_4_duration_kde.png", (cleaned_bike, ), {
+            "topic": "duration"
+        }),
+    ]
+
+    if figure_dir is None:
+        for plot_function, _, args, kwargs in figures:
+            plot_function(*args, **kwargs)
+    else:
+        os.makedirs(figure_dir, exist_ok=True)
+        render_figures([(plot_function, os.path.join(figure_dir, file_name),
+                         args, kwargs)
+                        for plot_function, file_name, args, kwargs in figures])
 
 
 if __name__ == "__main__":
-    complete_task3()
+    # python 2_task3.py [figure_dir]: save the figures instead of showing them
+    complete_task3(sys.argv[1] if len(sys.argv) > 1 else None)
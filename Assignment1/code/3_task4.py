@@ -5,13 +5,17 @@ Created on Wed 09 20 09:31:07 2023
 @Author: Kingsley
 '''
 
-from sklearn.cluster import DBSCAN
-import numpy as np
-import pandas as pd
+from utils.cluster import NeighborIndex, geometry_coordinates
+from utils.station import (load_station_table, project_stations,
+                           station_geodataframe)
 from utils.preprocess import clean_station
 from config.global_vars import Project_Configs
+from utils.instrument import stage
+import pandas as pd
 import geopandas as gpd
-from utils.customized_plot import plot_clustering
+from utils.customized_plot import plot_clustering, render_figures
+import os
+import sys
 
 
 def pre_for_cluster():
@@ -21,34 +25,43 @@ def pre_for_cluster():
     Returns:
         gpd.GeoDataframe: station with geometry
     """
-    station = clean_station(
-        pd.read_csv(Project_Configs.STATION_DATA_PATH.value))
-    station["geometry"] = gpd.points_from_xy(station["lon"], station["lat"])
-    station_geom = gpd.GeoDataFrame(
-        station,
-        crs="epsg:4326").to_crs(f"epsg:{Project_Configs.PROJECT_CRS.value}")
+    # stations are projected once and cached (see utils/station.py)
+    if os.path.exists(Project_Configs.PREPROCESSED_STATION.value):
+        station_table = load_station_table()
+    else:
+        # task 1 has not run yet, the raw station data is cleaned here
+        station_table = project_stations(
+            clean_station(pd.read_csv(
+                Project_Configs.STATION_DATA_PATH.value)))
+    station_geom = station_geodataframe(station_table)
     return station_geom
 
 
-def cluster_station(station_geom):
+@stage
+def cluster_station(station_geom,
+                    eps: float = 600,
+                    min_samples: int = 3,
+                    neighbor_index: NeighborIndex = None):
     """core for clustering, eps = 600m, and , min_sample = 3
     (exclude current point)
 
     Args:
         station_geom (_type_): station for clustering
+        eps (float, optional): DBSCAN eps in meters. Defaults to 600.
+        min_samples (int, optional): DBSCAN min_samples. Defaults to 3.
+        neighbor_index (NeighborIndex, optional): neighbor index of
+        station_geom built with max_eps >= eps, reused when sweeping several
+        parameters (see utils/cluster.py). Defaults to None.
 
     Returns:
         gpd.GeoDataframe: gdf with a field "clustering"
     """
 
-    # generate ndarray for dbscan
-    points_list = (station_geom["geometry"].apply(
-        lambda geom: [geom.x, geom.y]).to_list())
-    points_to_cluster = np.array(points_list)
-
-    # clustering
-    dbscan = DBSCAN(eps=600, min_samples=3)
-    clusters = dbscan.fit_predict(points_to_cluster)
+    # clustering, coordinates are read from the geometry array directly
+    if neighbor_index is None:
+        neighbor_index = NeighborIndex(
+            geometry_coordinates(station_geom["geometry"]), eps)
+    clusters = neighbor_index.dbscan(eps, min_samples)
 
     # return the clustering result to gdf
     station_geom["clusters"] = clusters
@@ -56,7 +69,10 @@ def cluster_station(station_geom):
     return clusters, station_geom
 
 
-def complete_task4_bonus():
+@stage
+def complete_task4_bonus(figure_dir: str = None):
+    """task 4 (bonus), the clustering figure is saved into figure_dir (png,
+    headless) if given, otherwise shown."""
     chicago_base = gpd.read_file(Project_Configs.BASE_CHICAGO.value)
     # generate a gdf with spatial location, used for spatial clustering
     station_geom = pre_for_cluster()
@@ -64,7 +80,13 @@ def complete_task4_bonus():
     clusters, clustered_station = cluster_station(station_geom)
 
     # bonus: visualizing clustering
-    plot_clustering(clustered_station, clusters, chicago_base)
+    if figure_dir is None:
+        plot_clustering(clustered_station, clusters, chicago_base)
+    else:
+        os.makedirs(figure_dir, exist_ok=True)
+        render_figures([(plot_clustering,
+                         os.path.join(figure_dir, "4_clustering.png"),
+                         (clustered_station, clusters, chicago_base), {})])
     # print the information about station id and clustering groups
     print(
         "\n====================number of stations for each cluster====================\n"
@@ -81,4 +103,5 @@ def complete_task4_bonus():
 
 
 if __name__ == "__main__":
-    complete_task4_bonus()
+    # python 3_task4.py [figure_dir]: save the figure instead of showing it
+    complete_task4_bonus(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,291 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Mon 10 19 01:58:42 2026
+
+@Author: Kingsley
+'''
+
+import argparse
+import contextlib
+import datetime
+import importlib
+import io
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+import tracemalloc
+import numpy as np
+import pandas as pd
+
+CODE_DIR = os.path.dirname(os.path.abspath(__file__))
+ASSIGNMENT2_CODE_DIR = os.path.join(CODE_DIR, "..", "..", "Assignment2",
+                                    "code")
+
+
+def _rows(value):
+    # rows of a stage result (table / array), None otherwise
+    if isinstance(value, tuple):
+        value = value[0]
+    if isinstance(value, (pd.DataFrame, pd.Series, np.ndarray)):
+        return len(value)
+    return None
+
+
+class Benchmark:
+    """runs pipeline stages one by one and records wall time, cpu time, peak
+    python memory (tracemalloc, includes numpy / pandas buffers) and rows of
+    the result of each stage.
+
+    Args:
+        trace_memory (bool, optional): tracemalloc slows down python-heavy
+        stages, disable it for timing only. Defaults to True.
+    """
+
+    def __init__(self, trace_memory: bool = True):
+        self.trace_memory = trace_memory
+        self.stages = []
+
+    def run(self, name: str, func, *args, **kwargs):
+        """run func(*args, **kwargs) as stage name (its prints are
+        swallowed).
+
+        Returns:
+            _type_: result of func
+        """
+        if self.trace_memory:
+            tracemalloc.start()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        with contextlib.redirect_stdout(io.StringIO()):
+            value = func(*args, **kwargs)
+        wall, cpu = (time.perf_counter() - wall_start,
+                     time.process_time() - cpu_start)
+        peak = None
+        if self.trace_memory:
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        self.stages.append({
+            "stage": name,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "peak_bytes": peak,
+            "rows": _rows(value),
+        })
+        print(f"{name:<28} {wall:>9.3f}s "
+              f"{'' if peak is None else f'{peak / 2**20:>9.1f} MB'}")
+        return value
+
+
+def bike_benchmark(bench: Benchmark, trips: int, work_dir: str, seed: int):
+    """stages of the bike scripts (task 1-4) on synthetic data, work_dir is
+    the working directory (data_raw/ & data_cleaned/ are created there)."""
+    from config.global_vars import Project_Configs
+    from utils.synthetic import generate_bike_data
+    from utils.preprocess import (read_data, clean_raw_bike, clean_station,
+                                  merging_bike_station, convert_coordinate,
+                                  cal_distance_in_proj_coord)
+    from utils.station import project_stations, station_geodataframe
+    bike_trip_statistic = importlib.import_module(
+        "1_task2").bike_trip_statistic
+    cluster_station = importlib.import_module("3_task4").cluster_station
+
+    os.chdir(work_dir)
+    paths = bench.run("generate_bike_data", generate_bike_data, "./data_raw",
+                      trips, seed=seed)
+    raw_bike, raw_station = bench.run("read_data", read_data, paths["bike"],
+                                      paths["station"])
+    cleaned_bike = bench.run("clean_raw_bike", clean_raw_bike, raw_bike)
+    cleaned_station = clean_station(raw_station)
+    merged_bike = bench.run("merging_bike_station", merging_bike_station,
+                            cleaned_bike, cleaned_station)
+    projected_bike = bench.run("convert_coordinate", convert_coordinate,
+                               merged_bike, 4326,
+                               Project_Configs.PROJECT_CRS.value)
+    bench.run("cal_distance_in_proj_coord", cal_distance_in_proj_coord,
+              projected_bike.copy(), "trip_distance")
+    bench.run("bike_trip_statistic", bike_trip_statistic, projected_bike)
+    station_geom = station_geodataframe(project_stations(cleaned_station))
+    bench.run("cluster_station", cluster_station, station_geom)
+
+
+def _tz_local_trips(trips):
+    # pick up & drop off time in local time, as convert_timezone of the
+    # notebook
+    trips = trips[["pick_up_time", "drop_off_time", "pick_up_intersection",
+                   "drop_of_intersection"]]
+    return trips.assign(
+        pick_up_time=trips["pick_up_time"].dt.tz_convert("America/New_York"),
+        drop_off_time=trips["drop_off_time"].dt.tz_convert(
+            "America/New_York"))
+
+
+def taxi_benchmark(bench: Benchmark, trips: int, work_dir: str, seed: int):
+    """stages of the Assignment 2 notebook (ingest, batched aggregations,
+    OD matrix, distances, cube) on synthetic data, with the dask
+    threaded scheduler."""
+    import dask
+    from utils.synthetic import generate_taxi_data
+    from utils.taxi_store import ingest_taxi_csv, load_taxi_dataset
+    from utils.pipeline import TaxiPipeline
+    from utils.profile import profile_delayed
+    from utils.od_matrix import od_matrix_delayed
+    from utils.trip_distance import PairDistances, intersection_coordinates
+    from utils.road_network import load_road_graph, network_pair_distances
+    from utils.cube import TripCube
+
+    os.chdir(work_dir)
+    dask.config.set(scheduler="threads")
+    paths = bench.run("generate_taxi_data", generate_taxi_data, "./raw_data",
+                      trips, seed=seed)
+    bench.run("ingest_taxi_csv", ingest_taxi_csv, paths["taxi_id"],
+              "./cleaned_data/taxi_parquet")
+    pipeline = TaxiPipeline(load_taxi_dataset("./cleaned_data/taxi_parquet"))
+    raw_taxi_df = bench.run("persist_trips", lambda: pipeline.persist().trips)
+    intersections = pd.read_csv(paths["intersections"],
+                                names=["id", "latitude", "longitude"])
+
+    def aggregations():
+        pipeline.add(
+            "profile",
+            profile_delayed(raw_taxi_df, [
+                "taxi_id", "pick_up_time", "drop_off_time",
+                ("pick_up_intersection", "drop_of_intersection")
+            ]))
+        pipeline.add("trips_without_na", raw_taxi_df.dropna().index.size)
+        pipeline.add("od",
+                     od_matrix_delayed(raw_taxi_df, ids=intersections["id"]))
+        pipeline.add(
+            "trips_per_taxi",
+            raw_taxi_df.groupby("taxi_id")["pick_up_time"].count())
+        pipeline.add(
+            "trips_per_day",
+            raw_taxi_df.groupby(raw_taxi_df["trip_day"].astype("int16"))
+            ["taxi_id"].count())
+        return pipeline.compute()
+
+    bench.run("pipeline_aggregations", aggregations)
+    bench.run("pair_distances", PairDistances.from_od_matrix, pipeline["od"],
+              intersection_coordinates(intersections))
+    road_graph = bench.run("load_road_graph", load_road_graph,
+                           paths["roads"], paths["intersections"])
+    # empty distance cache, every pair is computed
+    with tempfile.TemporaryDirectory(dir="./cleaned_data") as cache_dir:
+        bench.run("network_pair_distances", network_pair_distances,
+                  pipeline["od"], road_graph, cache_dir)
+    bench.run("trip_cube", TripCube.from_dask, _tz_local_trips(raw_taxi_df))
+
+
+def _max_rss_kb():
+    # peak resident memory of the process (kB on linux), None where the
+    # resource module does not exist (Windows)
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def _git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"],
+                              cwd=CODE_DIR,
+                              capture_output=True,
+                              text=True,
+                              check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run_benchmark(bike_trips: int = 10000,
+                  taxi_trips: int = 10000,
+                  work_dir: str = r"./benchmark_data",
+                  output_dir: str = r"./benchmarks",
+                  seed: int = 0,
+                  trace_memory: bool = True):
+    """benchmark the bike & taxi pipelines on synthetic data (see
+    utils/synthetic.py) and write the results as json, named by time and
+    git commit, so that runs of different commits can be compared.
+
+    Args:
+        bike_trips (int, optional): 0 skips the bike stages.
+        Defaults to 10000.
+        taxi_trips (int, optional): 0 skips the taxi stages.
+        Defaults to 10000.
+        work_dir (str, optional): synthetic data & caches.
+        Defaults to r"./benchmark_data".
+        output_dir (str, optional): json results.
+        Defaults to r"./benchmarks".
+        seed (int, optional): Defaults to 0.
+        trace_memory (bool, optional): Defaults to True.
+
+    Raises:
+        FileNotFoundError: Assignment2/code is missing (taxi stages)
+
+    Returns:
+        _type_: str, path of the json results
+    """
+    work_dir, output_dir = os.path.abspath(work_dir), os.path.abspath(
+        output_dir)
+    bench = Benchmark(trace_memory)
+    cwd = os.getcwd()
+    try:
+        if bike_trips:
+            os.makedirs(os.path.join(work_dir, "bike"), exist_ok=True)
+            bike_benchmark(bench, bike_trips, os.path.join(work_dir, "bike"),
+                           seed)
+        if taxi_trips:
+            if not os.path.isdir(ASSIGNMENT2_CODE_DIR):
+                raise FileNotFoundError(
+                    f"{os.path.abspath(ASSIGNMENT2_CODE_DIR)} not found.")
+            # utils of Assignment2 join the utils namespace of Assignment1
+            sys.path.append(os.path.abspath(ASSIGNMENT2_CODE_DIR))
+            os.makedirs(os.path.join(work_dir, "taxi"), exist_ok=True)
+            taxi_benchmark(bench, taxi_trips, os.path.join(work_dir, "taxi"),
+                           seed)
+    finally:
+        os.chdir(cwd)
+
+    commit = _git_commit()
+    created = datetime.datetime.now()
+    result = {
+        "commit": commit,
+        "created": created.isoformat(timespec="seconds"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "bike_trips": bike_trips,
+        "taxi_trips": taxi_trips,
+        "seed": seed,
+        # peak resident memory of the whole run
+        "max_rss_kb": _max_rss_kb(),
+        "stages": bench.stages,
+    }
+    os.makedirs(output_dir, exist_ok=True)
+    output_path = os.path.join(
+        output_dir,
+        f"benchmark_{created:%Y%m%d_%H%M%S}_{commit or 'nogit'}.json")
+    with open(output_path, "w") as f:
+        json.dump(result, f, indent=2)
+    return output_path
+
+
+if __name__ == "__main__":
+    # from Assignment1/code: python benchmark.py --bike-trips 1e6
+    parser = argparse.ArgumentParser(
+        description="benchmark the bike & taxi pipelines on synthetic data")
+    parser.add_argument("--bike-trips", type=float, default=10000)
+    parser.add_argument("--taxi-trips", type=float, default=10000)
+    parser.add_argument("--work-dir", default=r"./benchmark_data")
+    parser.add_argument("--output-dir", default=r"./benchmarks")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--no-memory",
+                        action="store_true",
+                        help="timing only, without tracemalloc")
+    arguments = parser.parse_args()
+    print(
+        run_benchmark(int(arguments.bike_trips), int(arguments.taxi_trips),
+                      arguments.work_dir, arguments.output_dir,
+                      arguments.seed, not arguments.no_memory))
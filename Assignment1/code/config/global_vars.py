@@ -22,7 +22,14 @@ class Project_Configs(str, Enum):
     STATION_DATA_PATH = r"./data_raw/station.csv"
     PREPROCESSED_BIKE = r"./data_cleaned/chicago_data_cleaned.csv"
     PREPROCESSED_STATION = r"./data_cleaned/station_cleaned.csv"
+    CACHE_DIR = r"./data_cleaned/cache"
+    TILE_CACHE = r"./data_cleaned/cache/tiles"
+    TILE_CACHE_BYTES = 268435456
+    CHUNK_SIZE = 500000
+    TRIP_CUBE = r"./data_cleaned/trip_cube.parquet"
     BASE_CHICAGO = r"./data_raw/chicago.geojson"
+    FIGURE_DIR = r"./figures"
+    TRACE_DIR = r"./data_cleaned/traces"
     DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
     TIME_WINDOW_START = "2019-07-25 00:00:00"
     TIME_WINDOW_END = "2019-07-26 00:00:00"
@@ -0,0 +1,15 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 14:05:37 2026
+
+@Author: Kingsley
+'''
+
+import os
+import sys
+
+import matplotlib
+
+# headless, and code/ importable (utils, config) as when running the scripts
+matplotlib.use("Agg")
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 14:06:12 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+import geopandas as gpd
+import matplotlib.pyplot as plt
+from shapely.geometry import box
+from utils.basemap import TileCache
+from utils.customized_plot import plot_clustering
+
+
+def _stations():
+    rng = np.random.default_rng(0)
+    stations = gpd.GeoDataFrame(
+        {"clusters": np.repeat([0, 1, -1], 4)},
+        geometry=gpd.points_from_xy(-87.65 + rng.normal(0, 0.01, 12),
+                                    41.88 + rng.normal(0, 0.01, 12)),
+        crs="epsg:4326")
+    boundary = gpd.GeoDataFrame(geometry=[box(-87.7, 41.8, -87.6, 41.95)],
+                                crs="epsg:4326")
+    return stations, boundary
+
+
+def test_headless_plot_leaves_no_pyplot_figure(tmp_path, monkeypatch):
+    # empty tile cache, the boundary is drawn instead of tiles
+    monkeypatch.setattr(TileCache.__init__, "__defaults__",
+                        (str(tmp_path / "tiles"), 1 << 20))
+    stations, boundary = _stations()
+    plt.close("all")
+    before = plt.get_fignums()
+    savepath = tmp_path / "clustering.png"
+    plot_clustering(stations,
+                    stations["clusters"].to_numpy(),
+                    boundary,
+                    savepath=str(savepath))
+    assert savepath.exists()
+    assert plt.get_fignums() == before
+
+
+def test_headless_plot_keeps_existing_figures(tmp_path, monkeypatch):
+    monkeypatch.setattr(TileCache.__init__, "__defaults__",
+                        (str(tmp_path / "tiles"), 1 << 20))
+    stations, boundary = _stations()
+    plt.close("all")
+    plt.figure()
+    before = plt.get_fignums()
+    plot_clustering(stations,
+                    stations["clusters"].to_numpy(),
+                    boundary,
+                    savepath=str(tmp_path / "clustering.png"))
+    assert plt.get_fignums() == before
+    plt.close("all")
@@ -0,0 +1,328 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 21:24:06 2026
+
+@Author: Kingsley
+'''
+
+import io
+import math
+import os
+import warnings
+from collections import OrderedDict
+import numpy as np
+import geopandas as gpd
+from config.global_vars import Project_Configs
+
+# copied and customized tile urls. reference: transbigdata
+TILE_URLS = {
+    0:
+    r"https://tile.openstreetmap.org/{zoom}/{x}/{y}.png",
+    4:
+    r"https://api.mapbox.com/styles/v1/ni1o1/ckwfx658z4dpb14ocnz6tky9d"
+    r"/tiles/256/{zoom}/{x}/{y}?&access_token={token}",
+}
+TILE_SIZE = 256
+
+
+def deg2num(lat_deg, lon_deg, zoom):
+    """tile (x, y) containing a lon/lat point. reference: transbigdata"""
+    lat_rad = math.radians(lat_deg)
+    n = 2.0**zoom
+    xtile = int((lon_deg + 180.0) / 360.0 * n)
+    ytile = int(
+        (1.0 - math.log(math.tan(lat_rad) + (1 / math.cos(lat_rad))) / math.pi)
+        / 2.0 * n)
+    return xtile, ytile
+
+
+def num2deg(xtile, ytile, zoom):
+    """lat/lon of the north-west corner of a tile. reference: transbigdata"""
+    n = 2.0**zoom
+    lon_deg = xtile / n * 360.0 - 180.0
+    lat_deg = math.degrees(math.atan(math.sinh(math.pi *
+                                               (1 - 2 * ytile / n))))
+    return lat_deg, lon_deg
+
+
+def map_bounds(boundary: gpd.GeoDataFrame, lat_margin: float = 0.1):
+    """[lon1, lat1, lon2, lat2] of a boundary (any crs), with a margin in
+    latitude, as plotted by plot_clustering."""
+    bounds = boundary.to_crs("epsg:4326").total_bounds
+    bounds[1] = bounds[1] - lat_margin
+    bounds[3] = bounds[3] + lat_margin
+    return bounds
+
+
+def tile_range(bounds, zoom: int):
+    """x and y tile numbers covering [lon1, lat1, lon2, lat2]."""
+    xmin, ymax = deg2num(bounds[1], bounds[0], zoom)
+    xmax, ymin = deg2num(bounds[3], bounds[2], zoom)
+    return range(xmin, xmax + 1), range(ymin, ymax + 1)
+
+
+def _mapbox_token():
+    # the token set by tbd.set_mapboxtoken, as tbd.plot_map
+    try:
+        from transbigdata.plotmap import read_mapboxtoken
+        return read_mapboxtoken()
+    except Exception:
+        return ""
+
+
+class TileCache:
+    """local store of map tiles, one png file per (style, zoom, x, y) under
+    cache_dir/style/zoom/x/y.png. total size is bounded: when it grows over
+    max_bytes, least recently used tiles are removed (file mtime is the
+    access time, so the order survives between runs).
+
+    Args:
+        cache_dir (str, optional): Defaults to Project_Configs.TILE_CACHE.
+        max_bytes (int, optional): Defaults to
+        Project_Configs.TILE_CACHE_BYTES.
+    """
+
+    def __init__(self,
+                 cache_dir: str = Project_Configs.TILE_CACHE.value,
+                 max_bytes: int = int(Project_Configs.TILE_CACHE_BYTES.value)):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        # key -> file size, least recently used first
+        self.index = OrderedDict()
+        tiles = []
+        for root, _, files in os.walk(cache_dir):
+            for file_name in files:
+                if file_name.endswith(".png"):
+                    path = os.path.join(root, file_name)
+                    key = tuple(
+                        int(part) for part in os.path.relpath(
+                            path, cache_dir)[:-len(".png")].split(os.sep))
+                    stat = os.stat(path)
+                    tiles.append((stat.st_mtime_ns, key, stat.st_size))
+        for _, key, size in sorted(tiles):
+            self.index[key] = size
+
+    @property
+    def size(self):
+        return sum(self.index.values())
+
+    def path_of(self, style: int, zoom: int, x: int, y: int):
+        return os.path.join(self.cache_dir, str(style), str(zoom), str(x),
+                            f"{y}.png")
+
+    def get(self, style: int, zoom: int, x: int, y: int):
+        """cached tile as a PIL image, None if it is not cached."""
+        from PIL import Image
+
+        key = (style, zoom, x, y)
+        if key not in self.index:
+            return None
+        self.touch(key)
+        with Image.open(self.path_of(*key)) as tile:
+            return tile.convert("RGB")
+
+    def touch(self, key: tuple):
+        """mark a cached tile (style, zoom, x, y) as most recently used."""
+        os.utime(self.path_of(*key))
+        self.index.move_to_end(key)
+
+    def covers(self, style: int, zoom: int, xs, ys):
+        """whether every tile of the x & y ranges is cached in style."""
+        return all((style, zoom, x, y) in self.index for x in xs for y in ys)
+
+    def put(self, style: int, zoom: int, x: int, y: int, content: bytes):
+        """store the png bytes of a tile, evicting old tiles if needed."""
+        key = (style, zoom, x, y)
+        path = self.path_of(*key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as f:
+            f.write(content)
+        self.index[key] = len(content)
+        self.index.move_to_end(key)
+        self._evict()
+
+    def _evict(self):
+        total = self.size
+        while total > self.max_bytes and len(self.index) > 1:
+            key, size = self.index.popitem(last=False)
+            os.remove(self.path_of(*key))
+            total -= size
+
+    def download(self, style: int, zoom: int, x: int, y: int,
+                 timeout: float = 6):
+        """download a tile into the cache (the only method using network).
+
+        Returns:
+            _type_: bool, downloaded or not
+        """
+        import requests
+        from PIL import Image
+
+        url = TILE_URLS[style].format(zoom=zoom,
+                                      x=x,
+                                      y=y,
+                                      token=_mapbox_token())
+        try:
+            response = requests.get(
+                url,
+                headers={"User-Agent": "LSGI524 basemap tile cache"},
+                timeout=timeout)
+            response.raise_for_status()
+            # reject non image responses (e.g. an error page)
+            Image.open(io.BytesIO(response.content)).verify()
+        except Exception as e:
+            print(f"Tile {(style, zoom, x, y)} not downloaded: {e}")
+            return False
+        self.put(style, zoom, x, y, response.content)
+        return True
+
+
+def resolve_style(style: int):
+    """style to download: mapbox styles need a token, without it
+    OpenStreetMap (0) is used (with a warning), same as tbd.plot_map."""
+    if style not in TILE_URLS:
+        raise TypeError(f"Style {style} Not Found.")
+    if style != 0 and _mapbox_token() == "":
+        warnings.warn(f"No mapbox token, OpenStreetMap tiles (style 0) are "
+                      f"used instead of style {style}.")
+        return 0
+    return style
+
+
+def seed_tiles(bounds, zoom: int = 11, style: int = 4, cache=None):
+    """download the tiles of a bounding box that are not cached yet.
+    tiles of the box are kept as most recently used, so seeding evicts
+    other tiles first.
+
+    Args:
+        bounds (list): [lon1, lat1, lon2, lat2]
+        zoom (int, optional): Defaults to 11.
+        style (int, optional): 4 (mapbox light) or 0 (OpenStreetMap).
+        Defaults to 4.
+        cache (TileCache, optional): Defaults to None (default cache).
+
+    Raises:
+        ValueError: the tiles of the box do not fit into cache.max_bytes
+
+    Returns:
+        _type_: (number of tiles downloaded, number of tiles still missing)
+    """
+    cache = TileCache() if cache is None else cache
+    style = resolve_style(style)
+    xs, ys = tile_range(bounds, zoom)
+    keys = [(style, zoom, x, y) for x in xs for y in ys]
+    if cache.index:
+        # estimated from the tiles cached so far
+        mean_tile_bytes = cache.size / len(cache.index)
+        if len(keys) * mean_tile_bytes > cache.max_bytes:
+            warnings.warn(f"{len(keys)} tiles of ~{mean_tile_bytes:.0f} bytes "
+                          f"may not fit into {cache.max_bytes} bytes "
+                          f"(TILE_CACHE_BYTES).")
+    downloaded, missing, box_bytes = 0, 0, 0
+    for key in keys:
+        if key in cache.index:
+            cache.touch(key)
+            box_bytes += cache.index[key]
+            continue
+        if cache.download(*key):
+            downloaded += 1
+            box_bytes += cache.index.get(key, 0)
+        else:
+            missing += 1
+        # tiles of the box are evicted only once they alone exceed max_bytes
+        if box_bytes > cache.max_bytes:
+            raise ValueError(
+                f"Tiles of the bounding box exceed {cache.max_bytes} bytes "
+                f"(TILE_CACHE_BYTES), raise it or seed a smaller zoom.")
+    return downloaded, missing
+
+
+def cached_style(bounds, zoom: int = 11, style: int = 4, cache=None):
+    """style whose tiles of the bounding box are all cached: style itself,
+    otherwise any other seeded style (with a warning), None if there is
+    none. independent of the mapbox token, so a cache seeded on one machine
+    renders the same tiles everywhere.
+
+    Returns:
+        _type_: int or None
+    """
+    if style not in TILE_URLS:
+        raise TypeError(f"Style {style} Not Found.")
+    cache = TileCache() if cache is None else cache
+    xs, ys = tile_range(bounds, zoom)
+    for candidate in [style] + [s for s in TILE_URLS if s != style]:
+        if cache.covers(candidate, zoom, xs, ys):
+            if candidate != style:
+                warnings.warn(f"Tiles of style {style} are not cached, the "
+                              f"cached style {candidate} is drawn instead.")
+            return candidate
+    return None
+
+
+def tile_mosaic(bounds, zoom: int = 11, style: int = 4, cache=None):
+    """stitch the cached tiles of a bounding box, without any network.
+    tiles of another style are used if style is not cached (see
+    cached_style).
+
+    Returns:
+        _type_: (np.ndarray image, extent [lon1, lon2, lat1, lat2] for
+        imshow), or None if any tile is not cached
+    """
+    from PIL import Image
+
+    cache = TileCache() if cache is None else cache
+    style = cached_style(bounds, zoom, style, cache)
+    if style is None:
+        return None
+    xs, ys = tile_range(bounds, zoom)
+    mosaic = Image.new("RGB", (len(xs) * TILE_SIZE, len(ys) * TILE_SIZE))
+    for i, x in enumerate(xs):
+        for j, y in enumerate(ys):
+            mosaic.paste(cache.get(style, zoom, x, y),
+                         box=(i * TILE_SIZE, j * TILE_SIZE))
+    lat1, lon1 = num2deg(xs[0], ys[-1] + 1, zoom)
+    lat2, lon2 = num2deg(xs[-1] + 1, ys[0], zoom)
+    return np.asarray(mosaic), (lon1, lon2, lat1, lat2)
+
+
+def plot_basemap(ax,
+                 bounds,
+                 zoom: int = 11,
+                 style: int = 4,
+                 cache=None,
+                 fallback: gpd.GeoDataFrame = None):
+    """draw the cached tiles of bounds on ax (lon/lat axes). if tiles are
+    missing (not seeded, see seed_tiles), the fallback boundary polygons
+    (BASE_CHICAGO if None) are drawn instead. no network is used, so the
+    result only depends on the cache.
+
+    Returns:
+        _type_: bool, tiles drawn or not
+    """
+    mosaic = tile_mosaic(bounds, zoom, style, cache)
+    if mosaic is not None:
+        image, extent = mosaic
+        ax.imshow(image, extent=extent)
+        return True
+
+    if fallback is None:
+        fallback = gpd.read_file(Project_Configs.BASE_CHICAGO.value)
+    fallback.to_crs("epsg:4326").plot(ax=ax,
+                                      facecolor="#f2f2f2",
+                                      edgecolor="#bdbdbd",
+                                      linewidth=0.5)
+    ax.set_xlim(bounds[0], bounds[2])
+    ax.set_ylim(bounds[1], bounds[3])
+    return False
+
+
+if __name__ == "__main__":
+    # seeding the tile cache, from code/: python -m utils.basemap [zoom] [style]
+    # bounds are those of BASE_CHICAGO as plotted by plot_clustering
+    import sys
+
+    seed_zoom = int(sys.argv[1]) if len(sys.argv) > 1 else 11
+    seed_style = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    seed_bounds = map_bounds(gpd.read_file(Project_Configs.BASE_CHICAGO.value))
+    downloaded, missing = seed_tiles(seed_bounds, seed_zoom, seed_style)
+    print(f"{downloaded} tiles downloaded, {missing} tiles missing.")
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 16:20:04 2026
+
+@Author: Kingsley
+'''
+
+import hashlib
+import json
+import os
+import warnings
+import pandas as pd
+from config.global_vars import Project_Configs
+
+
+def source_fingerprint(source_path: str):
+    """fingerprint of a source file, used for invalidating its cache.
+
+    Args:
+        source_path (str): path of the source file (usually a csv)
+
+    Returns:
+        _type_: dict, {"size": bytes, "mtime_ns": last modified time}
+    """
+    stat = os.stat(source_path)
+    return {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+
+def _cache_key(source_path: str, options: dict = None):
+    # absolute path & read options, so that files with the same name in other
+    # folders, or read with other kwargs (dtype, usecols...), do not share
+    # one cache. options are compared by their json text (str for dtypes).
+    key = json.dumps(
+        {
+            "path": os.path.abspath(source_path),
+            "options": options or {}
+        },
+        sort_keys=True,
+        default=str)
+    return hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+
+
+def cache_path_for(source_path: str,
+                   cache_dir: str = Project_Configs.CACHE_DIR.value,
+                   options: dict = None):
+    """parquet file that caches the given source file, read with options.
+
+    Args:
+        source_path (str): path of the source file
+        cache_dir (str, optional): cache folder.
+        Defaults to Project_Configs.CACHE_DIR.
+        options (dict, optional): kwargs the source is read with, e.g. those
+        of pd.read_csv. Defaults to None.
+
+    Returns:
+        _type_: str, path of the parquet cache
+    """
+    file_name = os.path.splitext(os.path.basename(source_path))[0]
+    return os.path.join(
+        cache_dir, f"{file_name}_{_cache_key(source_path, options)}.parquet")
+
+
+def _fingerprint_path(cache_path: str):
+    # sidecar file recording which version of the source the cache belongs to
+    return os.path.splitext(cache_path)[0] + ".json"
+
+
+def cache_is_valid(source_path: str,
+                   cache_dir: str = Project_Configs.CACHE_DIR.value,
+                   options: dict = None):
+    """check whether the cache still matches the source file (size & mtime).
+
+    Args:
+        source_path (str): path of the source file
+        cache_dir (str, optional): cache folder.
+        Defaults to Project_Configs.CACHE_DIR.
+        options (dict, optional): see cache_path_for. Defaults to None.
+
+    Returns:
+        _type_: bool
+    """
+    cache_path = cache_path_for(source_path, cache_dir, options)
+    if not (os.path.exists(cache_path)
+            and os.path.exists(_fingerprint_path(cache_path))):
+        return False
+    with open(_fingerprint_path(cache_path), "r") as f:
+        return json.load(f) == source_fingerprint(source_path)
+
+
+def mark_cache_valid(source_path: str,
+                     cache_dir: str = Project_Configs.CACHE_DIR.value,
+                     options: dict = None):
+    """record the current fingerprint of source_path next to its cache.
+    call it only after the parquet cache is completely written.
+
+    Args:
+        source_path (str): path of the source file
+        cache_dir (str, optional): cache folder.
+        Defaults to Project_Configs.CACHE_DIR.
+        options (dict, optional): see cache_path_for. Defaults to None.
+    """
+    cache_path = cache_path_for(source_path, cache_dir, options)
+    with open(_fingerprint_path(cache_path), "w") as f:
+        json.dump(source_fingerprint(source_path), f)
+
+
+def write_cache(df: pd.DataFrame,
+                source_path: str,
+                cache_dir: str = Project_Configs.CACHE_DIR.value,
+                options: dict = None):
+    """write df into the columnar cache of source_path, keeping its dtypes.
+
+    Args:
+        df (pd.DataFrame): typed data parsed from source_path
+        source_path (str): path of the source file
+        cache_dir (str, optional): cache folder.
+        Defaults to Project_Configs.CACHE_DIR.
+        options (dict, optional): kwargs that parse source_path into df
+        (see cache_path_for). Defaults to None.
+
+    Returns:
+        _type_: str, path of the parquet cache
+    """
+    os.makedirs(cache_dir, exist_ok=True)
+    cache_path = cache_path_for(source_path, cache_dir, options)
+    df.to_parquet(cache_path, engine="pyarrow")
+    # NOTE fingerprint is written after the data, so an interrupted write
+    # never leaves a cache that looks valid.
+    mark_cache_valid(source_path, cache_dir, options)
+    return cache_path
+
+
+def read_csv_cached(source_path: str,
+                    cache_dir: str = Project_Configs.CACHE_DIR.value,
+                    **read_csv_kwargs):
+    """read a csv through the columnar cache.
+    the csv is parsed only if the cache is missing or the csv has changed
+    (size or mtime), afterwards the typed parquet copy is loaded directly.
+    the cache is kept per read_csv_kwargs, so other kwargs parse the csv.
+    columns parquet cannot store (e.g. mixed types in one object column) are
+    not cached, the parsed csv is returned as before (with a warning).
+
+    Args:
+        source_path (str): path of the csv
+        cache_dir (str, optional): cache folder.
+        Defaults to Project_Configs.CACHE_DIR.
+        **read_csv_kwargs: passed to pd.read_csv, e.g. parse_dates.
+
+    Returns:
+        _type_: pd.DataFrame
+    """
+    if cache_is_valid(source_path, cache_dir, read_csv_kwargs):
+        return pd.read_parquet(cache_path_for(source_path, cache_dir,
+                                              read_csv_kwargs),
+                               engine="pyarrow")
+    df = pd.read_csv(source_path, **read_csv_kwargs)
+    try:
+        write_cache(df, source_path, cache_dir, read_csv_kwargs)
+    except (TypeError, ValueError) as e:
+        # pyarrow.ArrowTypeError / ArrowInvalid, the cache stays invalid
+        # (no fingerprint is written)
+        warnings.warn(f"{source_path} not cached: {e}")
+    return df
@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 20:12:08 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+import scipy.sparse as sp
+from sklearn.cluster import DBSCAN
+from sklearn.neighbors import NearestNeighbors
+from utils.distance import point_coordinates
+
+
+def geometry_coordinates(points):
+    """(n, 2) coordinate array of a point GeoSeries, without a python loop
+    over the geometries."""
+    return np.column_stack(point_coordinates(points))
+
+
+class NeighborIndex:
+    """radius neighbor graph of points, searched once with a KD-tree up to
+    max_eps and reused by DBSCAN for any eps <= max_eps and any min_samples.
+
+    Args:
+        coordinates (np.ndarray): (n, 2) projected coordinates
+        max_eps (float): largest eps that will be clustered with
+    """
+
+    def __init__(self, coordinates, max_eps: float):
+        self.coordinates = np.asarray(coordinates, dtype="float64")
+        self.max_eps = max_eps
+        self.graph = NearestNeighbors(
+            radius=max_eps, algorithm="kd_tree").fit(
+                self.coordinates).radius_neighbors_graph(mode="distance")
+
+    def graph_within(self, eps: float):
+        """neighbor graph restricted to distance <= eps (sparse, explicit
+        zeros kept for duplicated points)."""
+        if eps > self.max_eps:
+            raise ValueError(f"eps {eps} is larger than max_eps "
+                             f"{self.max_eps} of the index.")
+        rows = np.repeat(np.arange(self.graph.shape[0]),
+                         np.diff(self.graph.indptr))
+        within = self.graph.data <= eps
+        return sp.csr_matrix((self.graph.data[within],
+                              (rows[within], self.graph.indices[within])),
+                             shape=self.graph.shape)
+
+    def dbscan(self, eps: float, min_samples: int):
+        """DBSCAN labels (-1 for noisy points), same as
+        sklearn DBSCAN(eps, min_samples) on the coordinates."""
+        return DBSCAN(eps=eps, min_samples=min_samples,
+                      metric="precomputed").fit_predict(
+                          self.graph_within(eps))
+
+    def sweep(self, params):
+        """DBSCAN for several (eps, min_samples) pairs on the same index.
+
+        Returns:
+            _type_: dict, (eps, min_samples) -> labels
+        """
+        return {(eps, min_samples): self.dbscan(eps, min_samples)
+                for eps, min_samples in params}
@@ -0,0 +1,371 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 19:26:50 2026
+
+@Author: Kingsley
+'''
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from config.global_vars import Project_Configs
+
+
+def _date_and_hour(times: pd.Series):
+    # local date (naive datetime64 at midnight) and hour of departure
+    dates = times.dt.normalize()
+    if dates.dt.tz is not None:
+        dates = dates.dt.tz_localize(None)
+    return dates, times.dt.hour.astype("int8")
+
+
+def _fingerprint_path(cube_path: str):
+    # sidecar recording which trips the persisted cube was counted from
+    return os.path.splitext(cube_path)[0] + ".json"
+
+
+def date_fingerprints(trips: pd.DataFrame,
+                      time_column: str = "start_time",
+                      origin: str = "from_station_id",
+                      destination: str = "to_station_id",
+                      end_column: str = "end_time"):
+    """content fingerprint of the trips of every local (departure) date
+    (number of trips and the sum of the row hashes of origin, destination,
+    departure & arrival time), so a changed day is found without comparing
+    the trips. independent of the row order.
+
+    Returns:
+        _type_: dict, "YYYY-MM-DD" -> str
+    """
+    if len(trips) == 0:
+        return {}
+    dates, _ = _date_and_hour(trips[time_column])
+    hashes = pd.util.hash_pandas_object(
+        trips[[origin, destination, time_column, end_column]],
+        index=False).to_numpy()
+    codes, unique_dates = pd.factorize(dates)
+    order = np.argsort(codes, kind="stable")
+    starts = np.flatnonzero(np.diff(codes[order], prepend=-1))
+    # uint64 sums wrap around, which is fine for a fingerprint
+    sums = np.add.reduceat(hashes[order], starts)
+    sizes = np.diff(np.append(starts, len(order)))
+    return {
+        date.strftime("%Y-%m-%d"): f"{size}:{total:016x}"
+        for date, size, total in zip(unique_dates[codes[order][starts]],
+                                     sizes, sums)
+    }
+
+
+class TripCube:
+    """trip counts aggregated by origin, destination, local date and hour of
+    departure and local date and hour of arrival. built once from the
+    cleaned trips (or updated with new days), so that departure / arrival /
+    hourly counts of any slice are read from the cube instead of grouping
+    the raw trips again.
+    NOTE "date" & "hour" are those of the departure (rows are replaced by
+    departure date, see update), arrival slices use "arrival_date" &
+    "arrival_hour".
+
+    Args:
+        counts (pd.DataFrame): fields <origin, destination, "date", "hour",
+        "arrival_date", "arrival_hour", "trips">
+        origin (str, optional): origin id field.
+        Defaults to "from_station_id".
+        destination (str, optional): destination id field.
+        Defaults to "to_station_id".
+    """
+
+    def __init__(self,
+                 counts: pd.DataFrame,
+                 origin: str = "from_station_id",
+                 destination: str = "to_station_id"):
+        self.origin = origin
+        self.destination = destination
+        self.counts = counts.sort_values(
+            ["date", "hour", origin, destination]).reset_index(drop=True)
+
+    @classmethod
+    def from_trips(cls,
+                   trips: pd.DataFrame,
+                   time_column: str = "start_time",
+                   origin: str = "from_station_id",
+                   destination: str = "to_station_id",
+                   end_column: str = "end_time"):
+        """aggregate trips (pandas) into a cube, by departure and arrival
+        time.
+
+        Args:
+            trips (pd.DataFrame): trips with origin, destination,
+            time_column and end_column (datetime64, local time or tz-aware)
+            time_column (str, optional): Defaults to "start_time".
+            origin (str, optional): Defaults to "from_station_id".
+            destination (str, optional): Defaults to "to_station_id".
+            end_column (str, optional): Defaults to "end_time".
+
+        Returns:
+            _type_: TripCube
+        """
+        dates, hours = _date_and_hour(trips[time_column])
+        arrival_dates, arrival_hours = _date_and_hour(trips[end_column])
+        counts = trips.groupby(
+            [trips[origin], trips[destination],
+             dates.rename("date"),
+             hours.rename("hour"),
+             arrival_dates.rename("arrival_date"),
+             arrival_hours.rename("arrival_hour")]).size().rename(
+                 "trips").reset_index()
+        return cls(counts, origin, destination)
+
+    @classmethod
+    def from_dask(cls,
+                  trips,
+                  time_column: str = "pick_up_time",
+                  origin: str = "pick_up_intersection",
+                  destination: str = "drop_of_intersection",
+                  split_out: int = 1,
+                  end_column: str = "drop_off_time"):
+        """aggregate a dask dataframe of trips into a cube, each partition is
+        counted on its own and the partial counts are summed.
+
+        Args:
+            trips (dd.DataFrame): trips with origin, destination,
+            time_column and end_column (tz-aware datetime in local timezone)
+            time_column (str, optional): Defaults to "pick_up_time".
+            origin (str, optional): Defaults to "pick_up_intersection".
+            destination (str, optional): Defaults to "drop_of_intersection".
+            split_out (int, optional): partitions of the aggregated result,
+            passed to dask groupby. Defaults to 1.
+            end_column (str, optional): Defaults to "drop_off_time".
+
+        Returns:
+            _type_: TripCube
+        """
+        return trip_cube_delayed(trips, time_column, origin, destination,
+                                 split_out, end_column).compute()
+
+    @property
+    def dates(self):
+        """local dates covered by the cube."""
+        return pd.DatetimeIndex(self.counts["date"].unique())
+
+    def update(self, new_cube: "TripCube"):
+        """add the counts of newly arrived days. days that are already in the
+        cube are replaced by the new counts, so re-loading a day is safe.
+
+        Returns:
+            _type_: self
+        """
+        kept = self.counts[~self.counts["date"].isin(new_cube.dates)]
+        self.counts = pd.concat([kept, new_cube.counts]).sort_values(
+            ["date", "hour", self.origin,
+             self.destination]).reset_index(drop=True)
+        return self
+
+    def save(self,
+             cube_path: str = Project_Configs.TRIP_CUBE.value,
+             fingerprint: dict = None):
+        """persist the counts, with the fingerprint of the trips they were
+        counted from (see load_if_current)."""
+        os.makedirs(os.path.dirname(cube_path), exist_ok=True)
+        if os.path.exists(_fingerprint_path(cube_path)):
+            os.remove(_fingerprint_path(cube_path))
+        self.counts.to_parquet(cube_path, engine="pyarrow")
+        # NOTE fingerprint after the data, an interrupted write is never valid
+        if fingerprint is not None:
+            with open(_fingerprint_path(cube_path), "w") as f:
+                json.dump(fingerprint, f)
+
+    @property
+    def has_arrivals(self):
+        """whether the counts have arrival buckets (cubes saved before they
+        were added have not)."""
+        return {"arrival_date", "arrival_hour"} <= set(self.counts.columns)
+
+    @classmethod
+    def load(cls,
+             cube_path: str = Project_Configs.TRIP_CUBE.value,
+             origin: str = "from_station_id",
+             destination: str = "to_station_id"):
+        return cls(pd.read_parquet(cube_path, engine="pyarrow"), origin,
+                   destination)
+
+    @staticmethod
+    def saved_fingerprint(cube_path: str = Project_Configs.TRIP_CUBE.value):
+        """fingerprint saved with the cube, None if there is none."""
+        if not (os.path.exists(cube_path)
+                and os.path.exists(_fingerprint_path(cube_path))):
+            return None
+        with open(_fingerprint_path(cube_path), "r") as f:
+            return json.load(f)
+
+    @classmethod
+    def load_if_current(cls,
+                        cube_path: str,
+                        fingerprint: dict,
+                        origin: str = "from_station_id",
+                        destination: str = "to_station_id"):
+        """the persisted cube if it was saved with the same fingerprint (e.g.
+        source_fingerprint of the raw csv, utils/cache.py), otherwise None
+        and the cube has to be built again (also if it was saved without
+        arrival buckets).
+
+        Returns:
+            _type_: TripCube or None
+        """
+        if cls.saved_fingerprint(cube_path) != fingerprint:
+            return None
+        cube = cls.load(cube_path, origin, destination)
+        return cube if cube.has_arrivals else None
+
+    def slice(self,
+              dates=None,
+              hours=None,
+              origins=None,
+              destinations=None,
+              arrival: bool = False):
+        """counts of the cube restricted to some dates / hours / stations.
+
+        Args:
+            dates (list, optional): local dates, e.g. ["2019-07-25"].
+            hours (list, optional): hours of day, 0-23.
+            origins (list, optional): origin ids.
+            destinations (list, optional): destination ids.
+            all default to None (no restriction).
+            arrival (bool, optional): dates & hours are those of the arrival
+            instead of the departure. Defaults to False.
+
+        Returns:
+            _type_: pd.Dataframe, rows of the cube
+        """
+        date_field, hour_field = ("arrival_date", "arrival_hour") \
+            if arrival else ("date", "hour")
+        mask = np.ones(len(self.counts), dtype=bool)
+        if dates is not None:
+            mask &= self.counts[date_field].isin(
+                pd.to_datetime(dates)).to_numpy()
+        if hours is not None:
+            mask &= self.counts[hour_field].isin(hours).to_numpy()
+        if origins is not None:
+            mask &= self.counts[self.origin].isin(origins).to_numpy()
+        if destinations is not None:
+            mask &= self.counts[self.destination].isin(destinations).to_numpy()
+        return self.counts[mask]
+
+    def departures(self, **slice_kwargs):
+        """number of departures per origin (see slice for the filters,
+        dates & hours of departure)."""
+        return self.slice(**slice_kwargs).groupby(self.origin)["trips"].sum()
+
+    def arrivals(self, **slice_kwargs):
+        """number of arrivals per destination (see slice for the filters,
+        dates & hours of arrival)."""
+        return self.slice(arrival=True, **slice_kwargs).groupby(
+            self.destination)["trips"].sum()
+
+    def hourly(self, by_date: bool = False, **slice_kwargs):
+        """number of departures per hour (or per date & hour if by_date)."""
+        keys = ["date", "hour"] if by_date else ["hour"]
+        return self.slice(**slice_kwargs).groupby(keys)["trips"].sum()
+
+    def daily(self, **slice_kwargs):
+        """number of departures per local date."""
+        return self.slice(**slice_kwargs).groupby("date")["trips"].sum()
+
+
+def trip_cube_delayed(trips,
+                      time_column: str = "pick_up_time",
+                      origin: str = "pick_up_intersection",
+                      destination: str = "drop_of_intersection",
+                      split_out: int = 1,
+                      end_column: str = "drop_off_time"):
+    """lazy TripCube.from_dask, e.g. to be computed together with other
+    results (see TaxiPipeline / dask.compute).
+
+    Returns:
+        _type_: dask Delayed of the TripCube
+    """
+    import dask
+
+    def count_partition(partition):
+        return TripCube.from_trips(partition, time_column, origin,
+                                   destination, end_column).counts
+
+    meta = pd.DataFrame({
+        origin: pd.Series(dtype=trips[origin].dtype),
+        destination: pd.Series(dtype=trips[destination].dtype),
+        "date": pd.Series(dtype="datetime64[ns]"),
+        "hour": pd.Series(dtype="int8"),
+        "arrival_date": pd.Series(dtype="datetime64[ns]"),
+        "arrival_hour": pd.Series(dtype="int8"),
+        "trips": pd.Series(dtype="int64"),
+    })
+    counts = trips[[origin, destination, time_column,
+                    end_column]].map_partitions(
+        count_partition, meta=meta).groupby(
+            [origin, destination, "date", "hour", "arrival_date",
+             "arrival_hour"]).trips.sum(
+                split_out=split_out).reset_index()
+    return dask.delayed(TripCube)(counts, origin, destination)
+
+
+def load_trip_cube(trips: pd.DataFrame = None,
+                   cube_path: str = Project_Configs.TRIP_CUBE.value,
+                   time_column: str = "start_time",
+                   end_column: str = "end_time"):
+    """load the persisted cube of bike trips, (re)counting the days of trips
+    that are not in it yet or whose trips changed since they were counted
+    (date_fingerprints saved next to the cube), e.g. after cleaning again.
+    other days stay in the persisted cube, but the returned cube only holds
+    the (departure) dates of trips, so a changed TIME_WINDOW does not add in
+    old days. the cube is built from scratch the first time.
+
+    Args:
+        trips (pd.DataFrame, optional): cleaned bike trips. Defaults to None
+        (the whole persisted cube).
+        cube_path (str, optional): Defaults to Project_Configs.TRIP_CUBE.
+        time_column (str, optional): Defaults to "start_time".
+        end_column (str, optional): Defaults to "end_time".
+
+    Returns:
+        _type_: TripCube
+    """
+    cube = TripCube.load(cube_path) if os.path.exists(cube_path) else None
+    if cube is None or not cube.has_arrivals:
+        # no cube yet, or saved without arrival buckets: counted again
+        cube = TripCube(
+            pd.DataFrame(columns=[
+                "from_station_id", "to_station_id", "date", "hour",
+                "arrival_date", "arrival_hour", "trips"
+            ]).astype({
+                "from_station_id": "int64",
+                "to_station_id": "int64",
+                "date": "datetime64[ns]",
+                "hour": "int8",
+                "arrival_date": "datetime64[ns]",
+                "arrival_hour": "int8",
+                "trips": "int64"
+            }))
+        saved = {}
+    else:
+        # a cube without fingerprints (older or interrupted save) is recounted
+        saved = (TripCube.saved_fingerprint(cube_path) or {}).get("dates", {})
+    if trips is None:
+        return cube
+
+    fingerprints = date_fingerprints(trips, time_column, end_column=end_column)
+    stale_dates = [
+        date for date, fingerprint in fingerprints.items()
+        if saved.get(date) != fingerprint
+    ]
+    if stale_dates or not os.path.exists(cube_path):
+        trip_dates, _ = _date_and_hour(trips[time_column])
+        # update() replaces the counts of days already in the cube
+        cube.update(
+            TripCube.from_trips(
+                trips[trip_dates.isin(pd.to_datetime(stale_dates)).to_numpy()],
+                time_column,
+                end_column=end_column))
+        cube.save(cube_path, {"dates": {**saved, **fingerprints}})
+    return TripCube(cube.slice(dates=list(fingerprints)), cube.origin,
+                    cube.destination)
@@ -5,25 +5,102 @@ Created on Wed 09 20 09:30:16 2023
 @Author: Kingsley
 '''
 
+import functools
+import inspect
+import warnings
 import seaborn as sns
 import matplotlib.pyplot as plt
+from matplotlib.figure import Figure
 import pandas as pd
 import geopandas as gpd
-import transbigdata as tbd
 from config.global_vars import Project_Configs
+from utils.basemap import map_bounds, plot_basemap
+from utils.cube import TripCube
+from utils.instrument import stage
+from utils.kde import BinnedDensity
+from utils.station import StationContext, build_station_context
+from utils.time_bucket import LocalTimeBuckets
 
 plt.style.use("seaborn")
 
 
-def plot_kde(df: pd.DataFrame, topic="distance"):
-    """probability distribution plotting
+def _canvas(ax=None, savepath: str = None, figsize=(10, 6), dpi=None):
+    """figure & axes to draw on.
+    interactive (ax and savepath both None): a new pyplot figure, as before.
+    headless: the given ax, or a Figure that is not registered in pyplot, so
+    no GUI backend is needed. geopandas may still create pyplot figures while
+    drawing, those are closed by _headless.
+    """
+    if ax is not None:
+        return ax.figure, ax
+    if savepath is None:
+        fig = plt.figure(figsize=figsize, dpi=dpi)
+    else:
+        fig = Figure(figsize=figsize, dpi=dpi)
+    return fig, fig.add_subplot(111)
+
+
+def _render(fig, ax=None, savepath: str = None):
+    """save the figure (format from the extension, e.g. .png / .svg) if
+    savepath is given, show it if drawn interactively.
+
+    Returns:
+        _type_: matplotlib Figure
+    """
+    if savepath is not None:
+        fig.savefig(savepath)
+    elif ax is None:
+        plt.show()
+    return fig
+
+
+def _headless(plot_function):
+    """decorator of the plot functions: a headless call (savepath without
+    ax) leaves no pyplot figure behind. geopandas .plot(ax=...) calls
+    plt.draw(), which creates a pyplot figure even when drawing on a Figure
+    of _canvas, those new figures are closed after saving.
+    """
+    signature = inspect.signature(plot_function)
+
+    @functools.wraps(plot_function)
+    def wrapper(*args, **kwargs):
+        arguments = signature.bind(*args, **kwargs).arguments
+        if arguments.get("savepath") is None or arguments.get(
+                "ax") is not None:
+            return plot_function(*args, **kwargs)
+        fignums = set(plt.get_fignums())
+        try:
+            return plot_function(*args, **kwargs)
+        finally:
+            for fignum in set(plt.get_fignums()) - fignums:
+                plt.close(fignum)
+
+    return wrapper
+
+
+@_headless
+def plot_kde(df: pd.DataFrame,
+             topic="distance",
+             bins: int = 2048,
+             ax=None,
+             savepath: str = None):
+    """probability distribution plotting. the density is estimated on a
+    histogram of the column (utils.kde), not on every trip.
 
     Args:
         df (pd.DataFrame): df containing data
         topic (str, optional): topic. Defaults to "distance".
+        bins (int, optional): histogram bins of the estimate.
+        Defaults to 2048.
+        ax (optional): axes to draw on, nothing is shown. Defaults to None.
+        savepath (str, optional): write the figure here (.png / .svg)
+        instead of showing it. Defaults to None.
 
     Raises:
         TypeError: _description_
+
+    Returns:
+        _type_: matplotlib Figure
     """
     if topic == "distance":
         column = "trip_distance"
@@ -39,24 +116,33 @@ def plot_kde(df: pd.DataFrame, topic="distance"):
         step = 3000
     else:
         raise TypeError(f"Topic {topic} Not Found.")
-    plt.figure(figsize=(10, 6))
+    fig, canvas = _canvas(ax, savepath, figsize=(10, 6))
 
-    sns.kdeplot(
-        data=df[column],
-        shade=True,
-        color="b",
-        label=xlabel,
-    )
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.title(title)
-    plt.legend()
-    plt.grid(True)
-    plt.xticks(range(0, round(df[column].max()), step))
-    plt.show()
+    values = df[column].dropna()
+    if len(values) == 0:
+        warnings.warn(f"No {column} values, the density is not drawn.")
+    else:
+        lower, upper = values.min(), values.max()
+        if lower == upper:
+            # a single distinct value: one bin around it, the density is a
+            # spike of one bin width
+            lower, upper = lower - 0.5, upper + 0.5
+        grid, density = BinnedDensity.from_values(values, lower, upper,
+                                                  bins).density()
+        canvas.plot(grid, density, color="b", label=xlabel)
+        canvas.fill_between(grid, density, color="b", alpha=0.25)
+    canvas.set_xlabel(xlabel)
+    canvas.set_ylabel(ylabel)
+    canvas.set_title(title)
+    canvas.grid(True)
+    if len(values):
+        canvas.legend()
+        canvas.set_xticks(range(0, round(values.max()), step))
+    return _render(fig, ax, savepath)
 
 
 # NOTE Task 3.1 plot line trend
+@_headless
 def plot_trend(
     df: pd.DataFrame,
     target_column="start_time",
@@ -64,6 +150,9 @@ def plot_trend(
     y_column="departure_station_counts",
     palette=["#FF6B6B", "#FFD166", "#06D6A0", "#277DA1", "#FEAA40"],
     emphasis_range=[(7, 9), (16, 18)],
+    cube=None,
+    ax=None,
+    savepath: str = None,
 ):
     """line chart, showing time trend
 
@@ -79,20 +168,35 @@ def plot_trend(
         Defaults to ["#FF6B6B", "#FFD166", "#06D6A0", "#277DA1", "#FEAA40"].
         emphasis_range (list, optional):emphasis background, used for emphasis
           commuting time in this taks. Defaults to [(7, 9), (16, 18)].
+        cube (TripCube, optional): if given, hourly counts (by departure
+          time) are read from the cube and df is not used. Defaults to None.
+        ax (optional): axes to draw on, nothing is shown. Defaults to None.
+        savepath (str, optional): write the figure here (.png / .svg)
+          instead of showing it. Defaults to None.
+
+    Returns:
+        _type_: matplotlib Figure
     """
 
     # extracting hour
     temp_column1 = x_column
     temp_column2 = y_column
-    bike_group_by_hour = df.copy()
+    if cube is not None:
+        bike_time_line_plot = cube.hourly().rename_axis(
+            temp_column1).to_frame(temp_column2)
+    else:
+        bike_group_by_hour = df.copy()
 
-    bike_group_by_hour[temp_column1] = df[target_column].dt.hour
-    bike_time_line_plot = (bike_group_by_hour.groupby([temp_column1]).count()[[
-        target_column
-    ]].rename({target_column: temp_column2}, axis=1))
+        # int8 hour codes of the (local, naive) times
+        bike_group_by_hour[temp_column1] = LocalTimeBuckets().hour_codes(
+            df[target_column])
+        bike_time_line_plot = (bike_group_by_hour.groupby(
+            [temp_column1]).count()[[target_column
+                                     ]].rename({target_column: temp_column2},
+                                               axis=1))
 
     # create figure
-    plt.figure(figsize=(10, 6))
+    fig, canvas = _canvas(ax, savepath, figsize=(10, 6))
     macaron_colors = palette
 
     # plot
@@ -103,12 +207,13 @@ def plot_trend(
         color="b",
         markers=True,
         marker="o",
+        ax=canvas,
     )
 
     # some detailed, like axes and backgrounds.
-    plt.xticks(range(0, 24, 1))
+    canvas.set_xticks(range(0, 24, 1))
     if len(emphasis_range) >= 1:
-        plt.axvspan(
+        canvas.axvspan(
             emphasis_range[0][0],
             emphasis_range[0][1],
             alpha=0.2,
@@ -116,7 +221,7 @@ def plot_trend(
             label=
             f"Rush Hour ({emphasis_range[0][0]}:00-{emphasis_range[0][1]}:00)",
         )
-        plt.axvspan(
+        canvas.axvspan(
             emphasis_range[1][0],
             emphasis_range[1][1],
             alpha=0.2,
@@ -124,81 +229,89 @@ def plot_trend(
             label=
             f"Rush Hour ({emphasis_range[1][0]}:00-{emphasis_range[1][1]}:00)",
         )
-    for spine in plt.gca().spines.values():
+    for spine in canvas.spines.values():
         spine.set_edgecolor("white")
     for line in line_plot.lines:
         line.set_markerfacecolor("w")
         line.set_markeredgecolor("b")
-    plt.gca().set_facecolor("white")
-    plt.xlabel(temp_column1)
-    plt.ylabel(temp_column2)
-    plt.legend()
-    plt.show()
+    canvas.set_facecolor("white")
+    canvas.set_xlabel(temp_column1)
+    canvas.set_ylabel(temp_column2)
+    canvas.legend()
+    return _render(fig, ax, savepath)
 
 
+@_headless
 def plot_departure_spatial_distribution(df_bike: pd.DataFrame,
                                         df_station: pd.DataFrame,
-                                        base_df: gpd.GeoDataFrame):
-    depature_stations_number = (df_bike.groupby(["from_station_id"]).count()[[
-        "trip_id"
-    ]].rename({"trip_id": "departure_stations_count"}, axis=1))
-
-    fig, ax = plt.subplots(figsize=(8, 8))
-    df_station["geometry"] = gpd.points_from_xy(
-        df_station["lon"], df_station["lat"],
-        crs="epsg:4326").to_crs(f"epsg:{Project_Configs.PROJECT_CRS.value}")
-    station_geom = df_station.drop(["lon", "lat"], axis=1)
-    depature_station_gdf = gpd.GeoDataFrame(
-        depature_stations_number.merge(station_geom,
-                                       left_index=True,
-                                       right_index=True))
-    base_df.plot(ax=ax, alpha=0.5)
-    depature_station_gdf.plot(ax=ax,
+                                        base_df: gpd.GeoDataFrame,
+                                        context: StationContext = None,
+                                        ax=None,
+                                        savepath: str = None):
+    """spatial distribution of departures per station.
+    if context (utils/station.py) is given, df_bike & df_station are not used.
+    ax / savepath: see plot_kde. returns the matplotlib Figure.
+    """
+    if context is None:
+        context = build_station_context(df_station,
+                                        TripCube.from_trips(df_bike))
+
+    fig, canvas = _canvas(ax, savepath, figsize=(8, 8))
+    depature_station_gdf = context.departure_gdf
+    base_df.plot(ax=canvas, alpha=0.5)
+    depature_station_gdf.plot(ax=canvas,
                               column="departure_stations_count",
                               cmap="YlOrRd",
                               legend=True)
-    plt.axis("off")
-    plt.title("Spatial distribution of the number of depature stations")
-    plt.show()
+    canvas.set_axis_off()
+    canvas.set_title("Spatial distribution of the number of depature stations")
+    return _render(fig, ax, savepath)
 
 
+@_headless
 def plot_arrival_spatial_distribution(df_bike: pd.DataFrame,
                                       df_station: pd.DataFrame,
-                                      base_df: gpd.GeoDataFrame):
-    arrival_stations_number = (df_bike.groupby(["to_station_id"]).count()[[
-        "trip_id"
-    ]].rename({"trip_id": "arrival_stations_count"}, axis=1))
-    fig = plt.figure(1, (8, 8))
-    ax = plt.subplot(111)
-    df_station["geometry"] = gpd.points_from_xy(
-        df_station["lon"], df_station["lat"],
-        crs="epsg:4326").to_crs(f"epsg:{Project_Configs.PROJECT_CRS.value}")
-    station_geom = df_station.drop(["lon", "lat"], axis=1)
-    depature_station_gdf = gpd.GeoDataFrame(
-        arrival_stations_number.merge(station_geom,
-                                      left_index=True,
-                                      right_index=True))
-    base_df.plot(ax=ax, alpha=0.5)
-    depature_station_gdf.plot(ax=ax,
+                                      base_df: gpd.GeoDataFrame,
+                                      context: StationContext = None,
+                                      ax=None,
+                                      savepath: str = None):
+    """spatial distribution of arrivals per station.
+    if context (utils/station.py) is given, df_bike & df_station are not used.
+    ax / savepath: see plot_kde. returns the matplotlib Figure.
+    """
+    if context is None:
+        context = build_station_context(df_station,
+                                        TripCube.from_trips(df_bike))
+    fig, canvas = _canvas(ax, savepath, figsize=(8, 8))
+    depature_station_gdf = context.arrival_gdf
+    base_df.plot(ax=canvas, alpha=0.5)
+    depature_station_gdf.plot(ax=canvas,
                               column="arrival_stations_count",
                               cmap="YlOrRd",
                               legend=True)
-    plt.axis("off")
-    plt.title("Spatial distribution of the number of arrival stations")
-    plt.show()
-
-
-def plot_boxplot(df: pd.DataFrame, field: str, xlabel: str, ylabel: str,
-                 title: str, **kwargs):
+    canvas.set_axis_off()
+    canvas.set_title("Spatial distribution of the number of arrival stations")
+    return _render(fig, ax, savepath)
+
+
+@_headless
+def plot_boxplot(df: pd.DataFrame,
+                 field: str,
+                 xlabel: str,
+                 ylabel: str,
+                 title: str,
+                 ax=None,
+                 savepath: str = None,
+                 **kwargs):
     """simple box plot
+    ax / savepath: see plot_kde. returns the matplotlib Figure.
     """
-    fig = plt.figure(1, (12, 6), dpi=100)
-    ax = plt.subplot(111)
-    sns.boxplot(df[field], ax=ax, **kwargs)
-    plt.xlabel(xlabel)
-    plt.ylabel(ylabel)
-    plt.title(title)
-    plt.show()
+    fig, canvas = _canvas(ax, savepath, figsize=(12, 6), dpi=100)
+    sns.boxplot(df[field], ax=canvas, **kwargs)
+    canvas.set_xlabel(xlabel)
+    canvas.set_ylabel(ylabel)
+    canvas.set_title(title)
+    return _render(fig, ax, savepath)
 
 
 def plot_scale_and_north_arrow(vector_boundary, ax, crs="epsg:4326"):
@@ -335,26 +448,36 @@ def randomly_color_space(number):
     return custom_cmap
 
 
-def plot_clustering(clustering_station, clusters, base_boundary):
+@_headless
+def plot_clustering(clustering_station,
+                    clusters,
+                    base_boundary,
+                    ax=None,
+                    savepath: str = None):
     """bonus visualizing clusters results
 
     Args:
         clustering_station (df.Dataframe): stations with clusters
         clusters (bp.ndarray): clsuters array
         base_boundary (gdf.geodataframe): boundary, used for better visualize the location
+        ax (optional): axes to draw on, nothing is shown. Defaults to None.
+        savepath (str, optional): write the figure here (.png / .svg)
+        instead of showing it. Defaults to None.
+
+    Returns:
+        _type_: matplotlib Figure
     """
 
-    fig, ax = plt.subplots(1, 1, figsize=(4, 8), dpi=300)
+    fig, canvas = _canvas(ax, savepath, figsize=(4, 8), dpi=300)
     clustering_station = clustering_station.to_crs("epsg:4326")
     base_boundary = base_boundary.to_crs("epsg:4326")
     # extracting plotting boundary
-    bounds = base_boundary.dissolve().bounds.values[0]
-    bounds[1] = bounds[1] - 0.1
-    bounds[3] = bounds[3] + 0.1
+    bounds = map_bounds(base_boundary)
 
-    # requesting tiles from openstreetmap as background
-    tbd.plot_map(plt, bounds, zoom=11, style=4)
-    base_boundary.plot(ax=ax,
+    # background tiles from the local tile cache (seeded once, see
+    # utils/basemap.py), the boundary polygons are drawn if tiles are missing
+    plot_basemap(canvas, bounds, zoom=11, style=4, fallback=base_boundary)
+    base_boundary.plot(ax=canvas,
                        alpha=0.5,
                        edgecolor="white",
                        facecolor="grey",
@@ -366,17 +489,53 @@ def plot_clustering(clustering_station, clusters, base_boundary):
         if cluster != -1:
             subset = clustering_station[clustering_station['clusters'] ==
                                         cluster]
-            subset.plot(ax=ax,
+            subset.plot(ax=canvas,
                         color=color_space(cluster),
                         markersize=12,
                         label=f"Cluster {cluster}")
 
     # for noisy points(not core points or border points in DBSCAN clustering)
     clustering_station[clustering_station["clusters"] == -1].plot(
-        ax=ax, color="grey", markersize=8, label="Noisy Points", alpha=0.8)
-    ax.legend(title="Legend")
+        ax=canvas, color="grey", markersize=8, label="Noisy Points", alpha=0.8)
+    canvas.legend(title="Legend")
 
     # plot scale and north arrow
-    plot_scale_and_north_arrow(bounds, ax, crs="epsg:4326")
-    plt.title("station clustering")
-    plt.show()
+    plot_scale_and_north_arrow(bounds, canvas, crs="epsg:4326")
+    canvas.set_title("station clustering")
+    return _render(fig, ax, savepath)
+
+
+def _use_headless_backend():
+    import matplotlib
+
+    matplotlib.use("Agg")
+
+
+def _render_job(job):
+    plot_function, savepath, args, kwargs = job
+    plot_function(*args, savepath=savepath, **kwargs)
+    # geopandas calls plt.draw(), which creates an (empty) pyplot figure
+    plt.close("all")
+    return savepath
+
+
+@stage
+def render_figures(jobs, processes: int = None):
+    """render several figures concurrently, each in a worker process with a
+    non-interactive backend, written to its savepath (nothing is shown).
+
+    Args:
+        jobs (list): (plot function, savepath, args, kwargs), e.g.
+        (plot_kde, "./figures/distance.png", (bike,), {"topic": "distance"}).
+        plot functions must be importable (module level) and accept savepath.
+        processes (int, optional): worker processes. Defaults to None
+        (number of CPUs).
+
+    Returns:
+        _type_: list of the written savepaths
+    """
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(processes,
+                             initializer=_use_headless_backend) as pool:
+        return list(pool.map(_render_job, jobs))
@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 17:02:41 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+import shapely
+
+# mean earth radius (IUGG), in meters
+EARTH_RADIUS = 6371008.8
+
+
+def euclidean_distance(x1, y1, x2, y2):
+    """straight-line distance, for projected coordinates (e.g. meters)."""
+    return np.hypot(np.subtract(x2, x1), np.subtract(y2, y1))
+
+
+def manhattan_distance(x1, y1, x2, y2):
+    """L1 distance along the axes of projected coordinates, a rough
+    approximation of travel distance in grid cities."""
+    return np.abs(np.subtract(x2, x1)) + np.abs(np.subtract(y2, y1))
+
+
+def haversine_distance(lon1, lat1, lon2, lat2, radius: float = EARTH_RADIUS):
+    """great-circle distance between geographic coordinates (degrees), in the
+    unit of radius (meters by default)."""
+    lon1, lat1, lon2, lat2 = (np.radians(np.asarray(v, dtype="float64"))
+                              for v in (lon1, lat1, lon2, lat2))
+    a = (np.sin((lat2 - lat1) / 2)**2 +
+         np.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2)**2)
+    return 2 * radius * np.arcsin(np.sqrt(a))
+
+
+# NOTE haversine expects lon/lat, the others expect projected x/y
+DISTANCE_METRICS = {
+    "euclidean": euclidean_distance,
+    "manhattan": manhattan_distance,
+    "haversine": haversine_distance,
+}
+
+
+def pairwise_distance(x1, y1, x2, y2, metric: str = "euclidean"):
+    """element-wise distance between two coordinate arrays.
+
+    Args:
+        x1, y1, x2, y2 (array-like): coordinates of origins and destinations,
+        lon/lat for "haversine", projected x/y otherwise.
+        metric (str, optional): one of DISTANCE_METRICS.
+        Defaults to "euclidean".
+
+    Raises:
+        TypeError: unknown metric
+
+    Returns:
+        _type_: np.ndarray of distances
+    """
+    if metric not in DISTANCE_METRICS:
+        raise TypeError(f"Metric {metric} Not Found.")
+    return DISTANCE_METRICS[metric](x1, y1, x2, y2)
+
+
+def point_coordinates(points):
+    """x & y arrays of a point GeoSeries (or array of shapely points),
+    extracted without looping over the geometries in python.
+
+    Returns:
+        _type_: (np.ndarray, np.ndarray)
+    """
+    points = np.asarray(points)
+    return shapely.get_x(points), shapely.get_y(points)
@@ -0,0 +1,276 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Mon 10 19 02:31:05 2026
+
+@Author: Kingsley
+'''
+
+import atexit
+import contextlib
+import datetime
+import functools
+import json
+import os
+import sys
+import time
+from config.global_vars import Project_Configs
+
+# LSGI_TRACE=1 writes the trace into Project_Configs.TRACE_DIR,
+# LSGI_TRACE=<path>.json into that file, unset / 0 disables tracing
+TRACE_VARIABLE = "LSGI_TRACE"
+_SETTING = os.environ.get(TRACE_VARIABLE, "").strip()
+ENABLED = _SETTING.lower() not in ("", "0", "false", "no", "off")
+
+# ru_maxrss is in kB on linux, in bytes on macOS
+_MAXRSS_UNIT = 1 if sys.platform == "darwin" else 1024
+
+
+def _max_rss():
+    # peak resident memory, None where the POSIX-only resource module does
+    # not exist (Windows); imported here so that importing this module (and
+    # every decorated module) works without it
+    try:
+        import resource
+    except ImportError:
+        return None
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * _MAXRSS_UNIT
+
+
+def _current_rss():
+    # resident memory now (linux), None where /proc is not available
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def _rows(value):
+    # rows of a table / array (first item of a tuple), None otherwise
+    if isinstance(value, tuple) and value:
+        value = value[0]
+    shape = getattr(value, "shape", None)
+    if isinstance(shape, tuple) and shape and isinstance(shape[0], int):
+        return shape[0]
+    return None
+
+
+def _input_rows(args, kwargs):
+    for value in list(args) + list(kwargs.values()):
+        rows = _rows(value)
+        if rows is not None:
+            return rows
+    return None
+
+
+def _stage_name(func):
+    module = func.__module__
+    if module == "__main__":
+        # scripts (e.g. 0_task1.py) are named by their file
+        module = os.path.splitext(
+            os.path.basename(getattr(sys.modules[module], "__file__",
+                                     "main")))[0]
+    return f"{module}.{func.__qualname__}"
+
+
+class Trace:
+    """stages recorded in this process: wall time, cpu time, resident memory
+    (delta of the current and of the peak RSS), input / output rows and the
+    stage it ran in (nested stages), plus dask task stream summaries."""
+
+    def __init__(self):
+        self.created = datetime.datetime.now()
+        self.stages = []
+        self.dask = []
+        self._stack = []
+
+    @contextlib.contextmanager
+    def record(self, name: str, rows_in: int = None):
+        entry = {
+            "stage": name,
+            "parent": self._stack[-1] if self._stack else None,
+            "depth": len(self._stack),
+            "rows_in": rows_in,
+            "rows_out": None,
+        }
+        # listed when the stage starts, outer stages before inner ones
+        self.stages.append(entry)
+        self._stack.append(name)
+        rss_start, max_rss_start = _current_rss(), _max_rss()
+        wall_start, cpu_start = time.perf_counter(), time.process_time()
+        try:
+            yield entry
+        finally:
+            entry["wall_seconds"] = round(time.perf_counter() - wall_start, 6)
+            entry["cpu_seconds"] = round(time.process_time() - cpu_start, 6)
+            rss_end = _current_rss()
+            entry["rss_delta_bytes"] = (None if rss_start is None
+                                        or rss_end is None else rss_end -
+                                        rss_start)
+            max_rss_end = _max_rss()
+            entry["peak_rss_delta_bytes"] = (None if max_rss_start is None
+                                             or max_rss_end is None else
+                                             max_rss_end - max_rss_start)
+            self._stack.pop()
+
+    def to_dict(self):
+        return {
+            "created": self.created.isoformat(timespec="seconds"),
+            "argv": sys.argv,
+            "pid": os.getpid(),
+            "max_rss_bytes": _max_rss(),
+            "stages": self.stages,
+            "dask": self.dask,
+        }
+
+    def summary(self):
+        """one line per stage name (calls summed), in order of first call.
+
+        Returns:
+            _type_: str
+        """
+        totals = {}
+        for entry in self.stages:
+            total = totals.setdefault(
+                entry["stage"], {
+                    "calls": 0,
+                    "wall": 0.0,
+                    "cpu": 0.0,
+                    "peak": 0,
+                    "rows_in": entry["rows_in"],
+                    "rows_out": entry["rows_out"],
+                    "depth": entry["depth"],
+                })
+            total["calls"] += 1
+            total["wall"] += entry["wall_seconds"]
+            total["cpu"] += entry["cpu_seconds"]
+            total["peak"] = max(total["peak"], entry["peak_rss_delta_bytes"]
+                                or 0)
+        lines = [
+            f"{'stage':<48}{'calls':>6}{'wall s':>10}{'cpu s':>10}"
+            f"{'peak+ MB':>10}  rows"
+        ]
+        for name, total in totals.items():
+            lines.append(
+                f"{'  ' * total['depth'] + name:<48}{total['calls']:>6}"
+                f"{total['wall']:>10.3f}{total['cpu']:>10.3f}"
+                f"{total['peak'] / 2**20:>10.1f}  "
+                f"{total['rows_in']} -> {total['rows_out']}")
+        for stream in self.dask:
+            lines.append(f"dask {stream['stage']}: {stream['tasks']} tasks, "
+                         f"{stream['compute_seconds']:.3f}s compute, "
+                         f"{stream['transfer_seconds']:.3f}s transfer on "
+                         f"{stream['workers']} workers")
+        return "\n".join(lines)
+
+    def trace_path(self):
+        if _SETTING.lower().endswith(".json"):
+            return _SETTING
+        script = os.path.splitext(os.path.basename(sys.argv[0]))[0]
+        return os.path.join(
+            Project_Configs.TRACE_DIR.value,
+            f"{script or 'python'}_{self.created:%Y%m%d_%H%M%S}_"
+            f"{os.getpid()}.json")
+
+    def write(self):
+        """write the json trace and print the summary (at exit)."""
+        if not self.stages and not self.dask:
+            return None
+        path = self.trace_path()
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "w") as f:
+            json.dump(self.to_dict(), f, indent=2, default=str)
+        print(f"\n{self.summary()}\ntrace: {path}")
+        return path
+
+
+TRACE = Trace() if ENABLED else None
+if ENABLED:
+    atexit.register(TRACE.write)
+
+
+def stage(func):
+    """decorator recording every call of func as a stage of the trace.
+    without LSGI_TRACE, func is returned unchanged (no overhead).
+
+    Returns:
+        _type_: func, wrapped if tracing is enabled
+    """
+    if not ENABLED:
+        return func
+    name = _stage_name(func)
+
+    @functools.wraps(func)
+    def traced(*args, **kwargs):
+        with TRACE.record(name, _input_rows(args, kwargs)) as entry:
+            value = func(*args, **kwargs)
+            entry["rows_out"] = _rows(value)
+        return value
+
+    return traced
+
+
+def stage_block(name: str, rows_in: int = None):
+    """context manager recording a block of code as a stage, e.g.
+    with stage_block("render figures"): ...
+    """
+    if not ENABLED:
+        return contextlib.nullcontext({})
+    return TRACE.record(name, rows_in)
+
+
+def _summarize_task_stream(name: str, tasks: list):
+    from dask.utils import key_split
+
+    prefixes = {}
+    compute = transfer = 0.0
+    workers = set()
+    for task in tasks:
+        workers.add(task.get("worker"))
+        prefix = prefixes.setdefault(key_split(task["key"]), {
+            "tasks": 0,
+            "compute_seconds": 0.0
+        })
+        prefix["tasks"] += 1
+        for startstop in task.get("startstops", ()):
+            duration = startstop["stop"] - startstop["start"]
+            if startstop["action"] == "compute":
+                compute += duration
+                prefix["compute_seconds"] += duration
+            elif startstop["action"] == "transfer":
+                transfer += duration
+    for prefix in prefixes.values():
+        prefix["compute_seconds"] = round(prefix["compute_seconds"], 6)
+    return {
+        "stage": name,
+        "tasks": len(tasks),
+        "workers": len(workers),
+        "compute_seconds": round(compute, 6),
+        "transfer_seconds": round(transfer, 6),
+        "prefixes": prefixes,
+    }
+
+
+@contextlib.contextmanager
+def _task_stream(name: str):
+    try:
+        from distributed import get_client, get_task_stream
+        client = get_client()
+    except (ImportError, ValueError):
+        # no dask.distributed client: local scheduler, no task stream
+        yield
+        return
+    with get_task_stream(client=client) as stream:
+        yield
+    TRACE.dask.append(_summarize_task_stream(name, stream.data))
+
+
+def dask_task_stream(name: str):
+    """context manager adding the task stream of the current dask.distributed
+    Client (tasks, compute & transfer time per task prefix) to the trace.
+    does nothing without LSGI_TRACE or without a Client.
+    """
+    if not ENABLED:
+        return contextlib.nullcontext()
+    return _task_stream(name)
@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 20:48:35 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+
+
+class BinnedDensity:
+    """gaussian kernel density estimate on a fixed histogram.
+    values are first counted into equal-width bins over [lower, upper]
+    (chunk by chunk / partition by partition, histograms are mergeable),
+    then the histogram is convolved with the kernel by FFT, so the cost
+    depends on the number of bins, not on the number of values.
+
+    Args:
+        lower (float): lower edge of the bins
+        upper (float): upper edge of the bins, values outside are ignored
+        bins (int, optional): number of bins. Defaults to 2048.
+    """
+
+    def __init__(self, lower: float, upper: float, bins: int = 2048):
+        if not upper > lower:
+            raise ValueError("upper edge must be larger than lower edge.")
+        self.lower = float(lower)
+        self.upper = float(upper)
+        self.bins = bins
+        self.counts = np.zeros(bins)
+        # running moments of the binned values, for the default bandwidth
+        self.weight = 0.0
+        self.squared_weight = 0.0
+        self.mean = 0.0
+        # weighted sum of squared deviations from the mean
+        self.m2 = 0.0
+
+    @property
+    def bin_width(self):
+        return (self.upper - self.lower) / self.bins
+
+    @classmethod
+    def from_values(cls,
+                    values,
+                    lower: float,
+                    upper: float,
+                    bins: int = 2048,
+                    weights=None,
+                    frequencies=None):
+        """histogram of one chunk / partition."""
+        return cls(lower, upper, bins).update(values, weights, frequencies)
+
+    def update(self, values, weights=None, frequencies=None):
+        """count values into the bins (NaN and out of range are ignored),
+        optionally weighted. frequencies are repeat counts of the values
+        (e.g. trips of an origin-destination pair), the result is the same as
+        adding every value frequency times.
+
+        Returns:
+            _type_: self
+        """
+        values = np.asarray(values, dtype="float64").ravel()
+        weights = (np.ones_like(values) if weights is None else np.asarray(
+            weights, dtype="float64").ravel())
+        frequencies = (np.ones_like(values)
+                       if frequencies is None else np.asarray(
+                           frequencies, dtype="float64").ravel())
+        valid = (values >= self.lower) & (values <= self.upper)
+        values, weights, frequencies = (values[valid], weights[valid],
+                                        frequencies[valid])
+        squared_weights = weights**2 * frequencies
+        weights = weights * frequencies
+
+        bin_index = np.minimum(
+            ((values - self.lower) / self.bin_width).astype("int64"),
+            self.bins - 1)
+        self.counts += np.bincount(bin_index,
+                                   weights=weights,
+                                   minlength=self.bins)
+        self.squared_weight += squared_weights.sum()
+        weight = weights.sum()
+        if weight > 0:
+            mean = (values * weights).sum() / weight
+            self._add_moments(weight, mean,
+                              (weights * (values - mean)**2).sum())
+        return self
+
+    def merge(self, other: "BinnedDensity"):
+        """add the histogram of another chunk / partition (same bins).
+
+        Returns:
+            _type_: self
+        """
+        if (self.lower, self.upper, self.bins) != (other.lower, other.upper,
+                                                   other.bins):
+            raise ValueError("Only histograms with the same bins can merge.")
+        self.counts += other.counts
+        self.squared_weight += other.squared_weight
+        if other.weight > 0:
+            self._add_moments(other.weight, other.mean, other.m2)
+        return self
+
+    def _add_moments(self, weight, mean, m2):
+        # Chan et al. pairwise update, no cancellation for large values
+        total_weight = self.weight + weight
+        delta = mean - self.mean
+        self.mean += delta * weight / total_weight
+        self.m2 += m2 + delta**2 * self.weight * weight / total_weight
+        self.weight = total_weight
+
+    def scott_bandwidth(self):
+        """Scott's rule (as scipy / seaborn): std * n ** (-1 / 5), n is the
+        effective number of values when weighted."""
+        std = np.sqrt(self.m2 / self.weight)
+        effective_n = self.weight**2 / self.squared_weight
+        return std * effective_n**(-1 / 5)
+
+    def density(self, bandwidth: float = None, cut: float = 3):
+        """kernel density on the bin centers.
+
+        Args:
+            bandwidth (float, optional): kernel std, Scott's rule if None.
+            cut (float, optional): the grid is extended by cut * bandwidth
+            on both sides, like seaborn. Defaults to 3.
+
+        Returns:
+            _type_: (grid, density), np.ndarray each
+        """
+        if self.weight == 0:
+            raise ValueError("No values in the histogram.")
+        if bandwidth is None:
+            bandwidth = self.scott_bandwidth()
+        # at least one bin, so that a constant series still has a density
+        bandwidth = max(bandwidth, self.bin_width)
+
+        pad = int(np.ceil(cut * bandwidth / self.bin_width))
+        counts = np.pad(self.counts, pad)
+        offsets = np.arange(-pad, pad + 1) * self.bin_width
+        kernel = np.exp(-0.5 * (offsets / bandwidth)**2)
+        kernel /= kernel.sum()
+
+        # linear (not circular) convolution via zero-padded FFT
+        size = len(counts) + len(kernel) - 1
+        smoothed = np.fft.irfft(
+            np.fft.rfft(counts, size) * np.fft.rfft(kernel, size),
+            size)[pad:pad + len(counts)]
+        density = np.maximum(smoothed, 0) / (self.weight * self.bin_width)
+        grid = self.lower + (np.arange(len(counts)) - pad +
+                             0.5) * self.bin_width
+        return grid, density
+
+
+def merge_densities(densities):
+    """merge histograms of several chunks / partitions into a new one."""
+    densities = list(densities)
+    merged = BinnedDensity(densities[0].lower, densities[0].upper,
+                           densities[0].bins)
+    for density in densities:
+        merged.merge(density)
+    return merged
+
+
+def density_dask_series(series,
+                        lower: float,
+                        upper: float,
+                        bins: int = 2048):
+    """histogram every partition of a dask series and merge them, without
+    collecting or sampling the series.
+
+    Args:
+        series (dd.Series): numeric dask series
+        lower (float): lower edge of the bins
+        upper (float): upper edge of the bins, both may be dask Delayed
+        (e.g. quantiles of a lazy sketch), so that the range and the
+        histograms are computed in one dask.compute
+        bins (int, optional): Defaults to 2048.
+
+    Returns:
+        _type_: dask Delayed of a BinnedDensity
+    """
+    import dask
+
+    partition_densities = [
+        dask.delayed(BinnedDensity.from_values)(partition, lower, upper, bins)
+        for partition in series.to_delayed()
+    ]
+    return dask.delayed(merge_densities)(partition_densities)
@@ -0,0 +1,320 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Mon 10 19 00:21:37 2026
+
+@Author: Kingsley
+'''
+
+import warnings
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+
+def _positions(ids: np.ndarray, values):
+    # dense index of values in the sorted ids, -1 if missing / unknown
+    values = np.asarray(values, dtype="float64")
+    position = np.searchsorted(ids, np.nan_to_num(values, nan=-1))
+    position = np.minimum(position, len(ids) - 1)
+    known = (ids[position] == values) if len(ids) else np.zeros(
+        len(values), dtype=bool)
+    return np.where(known, position, -1)
+
+
+def _remap(matrix, old_ids: np.ndarray, new_ids: np.ndarray):
+    # same counts indexed by a larger id vocabulary (new_ids contain old_ids)
+    position = np.searchsorted(new_ids, old_ids)
+    coo = matrix.tocoo()
+    return sparse.csr_matrix(
+        (coo.data, (position[coo.row], position[coo.col])),
+        shape=(len(new_ids), len(new_ids)))
+
+
+class ODMatrix:
+    """trip counts from every origin to every destination, as sparse (CSR)
+    matrices over a dense index of the station / intersection ids, one
+    matrix per time code (e.g. local hour or day, see utils/time_bucket.py)
+    if the trips are built with a time column.
+    matrices of chunks / dask partitions are merged by adding them, every
+    row / column / top-k / time slice is read from the matrices instead of
+    grouping the trips again.
+
+    Args:
+        slices (dict): time code (None without time) -> csr_matrix of
+        shape (len(ids), len(ids)), rows are origins, columns destinations
+        ids (np.ndarray): sorted ids of the dense index
+        origin (str, optional): origin id field.
+        Defaults to "from_station_id".
+        destination (str, optional): destination id field.
+        Defaults to "to_station_id".
+        dropped (int, optional): trips left out, at ids not in ids.
+        Defaults to 0.
+
+    NOTE slices are not modified after construction (merge & time_slice
+    return new matrices), so the counts of all time codes are summed once.
+    """
+
+    def __init__(self,
+                 slices: dict,
+                 ids: np.ndarray,
+                 origin: str = "from_station_id",
+                 destination: str = "to_station_id",
+                 dropped: int = 0):
+        self.slices = slices
+        self.ids = np.asarray(ids)
+        self.origin = origin
+        self.destination = destination
+        self.dropped = dropped
+        self._matrix = None
+
+    @classmethod
+    def from_trips(cls,
+                   trips: pd.DataFrame,
+                   origin: str = "from_station_id",
+                   destination: str = "to_station_id",
+                   ids=None,
+                   time: str = None):
+        """count the trips (pandas) of every origin & destination in one
+        vectorized pass.
+
+        Args:
+            trips (pd.DataFrame): trips with origin, destination (and time)
+            origin (str, optional): Defaults to "from_station_id".
+            destination (str, optional): Defaults to "to_station_id".
+            ids (optional): all station / intersection ids, e.g. the id
+            column of the station table. trips whose origin or destination
+            is not in ids are left out (and counted in dropped).
+            Defaults to None (ids seen in the trips).
+            time (str, optional): integer time code field, e.g.
+            "trip_hour" (-1 is missing). Defaults to None (one matrix).
+
+        Returns:
+            _type_: ODMatrix
+        """
+        od = cls._count(trips, origin, destination, ids, time)
+        if od.dropped:
+            warnings.warn(f"{od.dropped} trips are at ids not in ids, "
+                          f"ignored.")
+        return od
+
+    @classmethod
+    def from_dask(cls,
+                  trips,
+                  origin: str = "pick_up_intersection",
+                  destination: str = "drop_of_intersection",
+                  ids=None,
+                  time: str = None):
+        """count a dask dataframe of trips, each partition is counted on its
+        own and the matrices are added (see od_matrix_delayed).
+
+        Returns:
+            _type_: ODMatrix
+        """
+        return od_matrix_delayed(trips, origin, destination, ids,
+                                 time).compute()
+
+    @classmethod
+    def _count(cls, trips, origin, destination, ids, time):
+        if ids is None:
+            ids = pd.unique(pd.concat(
+                [trips[origin], trips[destination]]).dropna())
+        ids = np.unique(np.asarray(ids, dtype="int64"))
+        rows = _positions(ids, trips[origin])
+        cols = _positions(ids, trips[destination])
+        valid = (rows >= 0) & (cols >= 0)
+        if time is None:
+            codes = np.zeros(len(trips), dtype="int64")
+        else:
+            codes = trips[time].to_numpy(dtype="int64")
+            valid &= codes >= 0
+        dropped = int(np.count_nonzero(
+            ~valid & trips[origin].notna().to_numpy()
+            & trips[destination].notna().to_numpy()))
+        keys, codes = np.unique(codes[valid], return_inverse=True)
+
+        # one (time x origin, destination) matrix, duplicates are summed,
+        # then split into one matrix per time code
+        n = len(ids)
+        stacked = sparse.csr_matrix(
+            (np.ones(len(codes), dtype="int64"),
+             (codes * n + rows[valid], cols[valid])),
+            shape=(len(keys) * n, n))
+        if time is None:
+            slices = {None: stacked if len(keys) else
+                      sparse.csr_matrix((n, n), dtype="int64")}
+        else:
+            slices = {
+                int(key): stacked[i * n:(i + 1) * n]
+                for i, key in enumerate(keys)
+            }
+        return cls(slices, ids, origin, destination, dropped)
+
+    def merge(self, other: "ODMatrix"):
+        """counts of both matrices (e.g. of two chunks / partitions), over
+        the union of their ids.
+
+        Returns:
+            _type_: ODMatrix
+        """
+        ids = np.union1d(self.ids, other.ids)
+        slices = {}
+        for od in (self, other):
+            same_ids = np.array_equal(od.ids, ids)
+            for key, matrix in od.slices.items():
+                if not same_ids:
+                    matrix = _remap(matrix, od.ids, ids)
+                slices[key] = slices[key] + matrix if key in slices \
+                    else matrix
+        return ODMatrix(slices, ids, self.origin, self.destination,
+                        self.dropped + other.dropped)
+
+    @property
+    def matrix(self):
+        """counts of all time codes, csr_matrix (origins x destinations),
+        summed on first use and kept for the row / column queries."""
+        if self._matrix is None:
+            self._matrix = sum(
+                self.slices.values(),
+                sparse.csr_matrix((len(self.ids), len(self.ids)),
+                                  dtype="int64")).tocsr()
+        return self._matrix
+
+    @property
+    def trips(self):
+        """number of trips counted."""
+        return int(self.matrix.sum())
+
+    def time_slice(self, codes):
+        """matrix restricted to some time codes, e.g. hours [7, 8, 9].
+
+        Raises:
+            TypeError: the matrix is built without time
+
+        Returns:
+            _type_: ODMatrix
+        """
+        if None in self.slices:
+            raise TypeError("Time codes Not Found, build with time=...")
+        slices = {
+            int(code): self.slices[int(code)]
+            for code in codes if int(code) in self.slices
+        }
+        return ODMatrix(slices, self.ids, self.origin, self.destination)
+
+    def _index(self, node_id):
+        position = _positions(self.ids, [node_id])[0]
+        if position < 0:
+            raise TypeError(f"Id {node_id} Not Found.")
+        return position
+
+    def row(self, origin_id):
+        """trips from one origin, per destination id (non-zero only)."""
+        row = self.matrix.getrow(self._index(origin_id))
+        return pd.Series(row.data, index=pd.Index(self.ids[row.indices],
+                                                  name=self.destination),
+                         name="trips").sort_index()
+
+    def column(self, destination_id):
+        """trips to one destination, per origin id (non-zero only)."""
+        column = self.matrix.getcol(self._index(destination_id)).tocoo()
+        return pd.Series(column.data, index=pd.Index(self.ids[column.row],
+                                                     name=self.origin),
+                         name="trips").sort_index()
+
+    def departures(self):
+        """number of departures of every id (0 included)."""
+        return pd.Series(np.asarray(self.matrix.sum(axis=1)).ravel(),
+                         index=pd.Index(self.ids, name=self.origin),
+                         name="departure_counts")
+
+    def arrivals(self):
+        """number of arrivals of every id (0 included)."""
+        return pd.Series(np.asarray(self.matrix.sum(axis=0)).ravel(),
+                         index=pd.Index(self.ids, name=self.destination),
+                         name="arrival_counts")
+
+    def top_k(self, k: int = 10):
+        """the k largest origin -> destination flows.
+
+        Returns:
+            _type_: pd.Dataframe, fields <origin, destination, "trips">
+        """
+        coo = self.matrix.tocoo()
+        k = min(k, coo.nnz)
+        largest = np.argpartition(-coo.data, k - 1)[:k] if k else np.empty(
+            0, dtype=np.intp)
+        largest = largest[np.argsort(-coo.data[largest], kind="stable")]
+        return pd.DataFrame({
+            self.origin: self.ids[coo.row[largest]],
+            self.destination: self.ids[coo.col[largest]],
+            "trips": coo.data[largest],
+        })
+
+    def to_frame(self):
+        """non-zero counts as rows <origin, destination, "trips"> (plus
+        "time" if the matrix has time codes), no rows if there are no
+        counts."""
+        if not self.slices:
+            # time coded matrix without any time code (e.g. no trips)
+            return pd.DataFrame({
+                "time": np.empty(0, dtype="int64"),
+                self.origin: self.ids[:0],
+                self.destination: self.ids[:0],
+                "trips": np.empty(0, dtype="int64"),
+            })
+        frames = []
+        for key, matrix in self.slices.items():
+            coo = matrix.tocoo()
+            frame = pd.DataFrame({
+                self.origin: self.ids[coo.row],
+                self.destination: self.ids[coo.col],
+                "trips": coo.data,
+            })
+            if key is not None:
+                frame.insert(0, "time", key)
+            frames.append(frame)
+        return pd.concat(frames, ignore_index=True)
+
+
+def merge_od_matrices(matrices: list):
+    """sum of the matrices of several chunks / partitions.
+
+    Returns:
+        _type_: ODMatrix
+    """
+    merged = matrices[0]
+    for od in matrices[1:]:
+        merged = merged.merge(od)
+    return merged
+
+
+def _merged_with_warning(matrices: list):
+    merged = merge_od_matrices(matrices)
+    if merged.dropped:
+        warnings.warn(f"{merged.dropped} trips are at ids not in ids, "
+                      f"ignored.")
+    return merged
+
+
+def od_matrix_delayed(trips,
+                      origin: str = "pick_up_intersection",
+                      destination: str = "drop_of_intersection",
+                      ids=None,
+                      time: str = None):
+    """lazy ODMatrix of a dask dataframe, counted per partition and merged,
+    e.g. to be computed together with other results (see dask.compute).
+    pass ids (e.g. the intersection table) so that all partitions share one
+    index, see ODMatrix.from_trips for the arguments.
+
+    Returns:
+        _type_: dask Delayed of the ODMatrix
+    """
+    import dask
+
+    columns = [origin, destination] + ([time] if time else [])
+    partials = [
+        dask.delayed(ODMatrix._count)(partition, origin, destination, ids,
+                                      time)
+        for partition in trips[columns].to_delayed()
+    ]
+    return dask.delayed(_merged_with_warning)(partials)
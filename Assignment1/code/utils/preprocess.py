@@ -5,11 +5,45 @@ Created on Wed 09 20 09:30:25 2023
 @Author: Kingsley
 '''
 
+import os
 from config.global_vars import Project_Configs
+from utils.cache import (read_csv_cached, write_cache, cache_path_for,
+                         mark_cache_valid, cache_is_valid)
+from utils.distance import pairwise_distance, point_coordinates
+from utils.instrument import stage
+from utils.station import (project_stations, stations_of_trips,
+                           attach_station_xy, StationLookup, MISSING_STATION)
+import numpy as np
 import pandas as pd
 import geopandas as gpd
 
-
+# columns of chicago_data.csv used after cleaning. numbers are read as
+# float64 (NaN for missing values, "1,234.0" / "390.5" are accepted), and
+# cast to int by clean_raw_bike after rows with missing values are dropped.
+RAW_BIKE_DTYPES = {
+    "trip_id": "float64",
+    "start_time": "object",
+    "end_time": "object",
+    "bikeid": "float64",
+    "tripduration": "float64",
+    "from_station_id": "float64",
+    "to_station_id": "float64",
+}
+
+# read_csv kwargs of the preprocessed files, their parquet caches are keyed
+# on them (see utils/cache.py)
+PREPROCESSED_BIKE_OPTIONS = {
+    "index_col": 0,
+    "parse_dates": ["start_time", "end_time"],
+    "encoding": Project_Configs.ENCODING.value,
+}
+PREPROCESSED_STATION_OPTIONS = {
+    "index_col": "station_id",
+    "encoding": Project_Configs.ENCODING.value,
+}
+
+
+@stage
 def read_data(
     bike_data_path: str = Project_Configs.BIKE_DATA_PATH,
     station_data_path: str = Project_Configs.STATION_DATA_PATH,
@@ -27,8 +61,9 @@ def read_data(
         _type_: _Dataframe_
     """
 
-    raw_bike = pd.read_csv(bike_data_path, encoding=encoding)
-    raw_station = pd.read_csv(station_data_path, encoding=encoding)
+    # parsed once, later runs load the columnar cache (see utils/cache.py)
+    raw_bike = read_csv_cached(bike_data_path, encoding=encoding)
+    raw_station = read_csv_cached(station_data_path, encoding=encoding)
     print("================RAW BIKE INFO================")
     print(raw_bike.info())
 
@@ -38,7 +73,89 @@ def read_data(
     return raw_bike, raw_station
 
 
+def _filter_time_window_str(raw_bike: pd.DataFrame):
+    # NOTE DATETIME_FORMAT is fixed-width and zero-padded, so comparing the
+    # raw strings gives the same result as comparing parsed datetimes.
+    # missing values compare as False and are dropped here as well.
+    return raw_bike[
+        (raw_bike["start_time"] >= Project_Configs.TIME_WINDOW_START.value)
+        & (raw_bike["end_time"] < Project_Configs.TIME_WINDOW_END.value)]
+
+
+def iter_raw_bike(
+    bike_data_path: str = Project_Configs.BIKE_DATA_PATH.value,
+    chunksize: int = int(Project_Configs.CHUNK_SIZE.value),
+    encoding: str = Project_Configs.ENCODING.value,
+):
+    """read raw bike data chunk by chunk, only the columns in RAW_BIKE_DTYPES
+    and only the trips inside the time window (filtered before parsing
+    datetime).
+
+    Args:
+        bike_data_path (str, optional): raw chicago_bike data.
+        Defaults to Project_Configs.BIKE_DATA_PATH.
+        chunksize (int, optional): rows per chunk.
+        Defaults to Project_Configs.CHUNK_SIZE.
+        encoding (str, optional): Defaults to Project_Configs.ENCODING.
+
+    Yields:
+        _type_: pd.Dataframe, raw trips in the time window
+    """
+    for raw_chunk in pd.read_csv(bike_data_path,
+                                 usecols=list(RAW_BIKE_DTYPES),
+                                 dtype=RAW_BIKE_DTYPES,
+                                 thousands=",",
+                                 encoding=encoding,
+                                 chunksize=chunksize):
+        yield _filter_time_window_str(raw_chunk)
+
+
+@stage
+def read_raw_bike(
+    bike_data_path: str = Project_Configs.BIKE_DATA_PATH.value,
+    encoding: str = Project_Configs.ENCODING.value,
+):
+    """read the raw bike trips inside the time window.
+    if bike_data_path is parquet (or has a valid parquet cache), the window is
+    pushed down as row-group filters, otherwise the csv is read in chunks and
+    trips out of the window are dropped before datetime parsing.
+
+    Args:
+        bike_data_path (str, optional): raw chicago_bike data (csv/parquet).
+        Defaults to Project_Configs.BIKE_DATA_PATH.
+        encoding (str, optional): Defaults to Project_Configs.ENCODING.
+
+    Returns:
+        _type_: pd.Dataframe, raw trips in the time window
+    """
+    parquet_path = None
+    if bike_data_path.endswith(".parquet"):
+        parquet_path = bike_data_path
+    elif cache_is_valid(bike_data_path, options={"encoding": encoding}):
+        # cache written by read_data
+        parquet_path = cache_path_for(bike_data_path,
+                                      options={"encoding": encoding})
+
+    if parquet_path is None:
+        return pd.concat(iter_raw_bike(bike_data_path, encoding=encoding),
+                         ignore_index=True)
+
+    import pyarrow.parquet as pq
+    window_start = Project_Configs.TIME_WINDOW_START.value
+    window_end = Project_Configs.TIME_WINDOW_END.value
+    # filters must match the stored type: string or timestamp
+    if str(pq.read_schema(parquet_path).field("start_time").type) != "string":
+        window_start, window_end = (pd.Timestamp(window_start),
+                                    pd.Timestamp(window_end))
+    return pd.read_parquet(parquet_path,
+                           engine="pyarrow",
+                           columns=list(RAW_BIKE_DTYPES),
+                           filters=[("start_time", ">=", window_start),
+                                    ("end_time", "<", window_end)])
+
+
 # NOTE: Task1 a):Data Cleaning for chicago.csv
+@stage
 def clean_raw_bike(raw_bike: pd.DataFrame):
     """clean bicycle data
 
@@ -56,12 +173,14 @@ def clean_raw_bike(raw_bike: pd.DataFrame):
     """
 
     # NOTE STEP1:drop useless columns
+    # (already absent if raw_bike was read by read_raw_bike/iter_raw_bike)
     bike_column_filtered = raw_bike.drop(
         [
             "usertype", "gender", "birthyear", "from_station_name",
             "to_station_name"
         ],
         axis=1,
+        errors="ignore",
     )
 
     # NOTE STEP2:drop rows with missing values(any)
@@ -106,6 +225,78 @@ def clean_raw_bike(raw_bike: pd.DataFrame):
     return bike_cleaned.reset_index(drop=True)
 
 
+@stage
+def clean_raw_bike_in_chunks(
+    bike_data_path: str = Project_Configs.BIKE_DATA_PATH.value,
+    output_path: str = Project_Configs.PREPROCESSED_BIKE.value,
+    cleaned_station: pd.DataFrame = None,
+    chunksize: int = int(Project_Configs.CHUNK_SIZE.value),
+    encoding: str = Project_Configs.ENCODING.value,
+):
+    """streaming version of clean_raw_bike, for trip files larger than memory.
+    raw data is read in chunks of <chunksize> rows (see iter_raw_bike),
+    each chunk goes through
+    clean_raw_bike (and merging_bike_station if cleaned_station is given)
+    and is appended to output_path and its parquet cache, so peak memory
+    depends on chunksize only.
+
+    NOTE: chunks are merged independently, so the output keeps the row
+    order of the raw file (raw trips are ordered by start_time).
+
+    Args:
+        bike_data_path (str, optional): raw chicago_bike data.
+        Defaults to Project_Configs.BIKE_DATA_PATH.
+        output_path (str, optional): cleaned output (csv).
+        Defaults to Project_Configs.PREPROCESSED_BIKE.
+        cleaned_station (pd.DataFrame, optional): cleaned station data, if
+        given, station locations are merged into each chunk. Defaults to None.
+        chunksize (int, optional): rows per chunk.
+        Defaults to Project_Configs.CHUNK_SIZE.
+        encoding (str, optional): Defaults to Project_Configs.ENCODING.
+
+    Returns:
+        _type_: int, the number of rows written
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    cache_path = cache_path_for(output_path,
+                                options=PREPROCESSED_BIKE_OPTIONS)
+    os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+
+    rows_written = 0
+    parquet_writer = None
+    try:
+        for raw_chunk in iter_raw_bike(bike_data_path, chunksize, encoding):
+            cleaned_chunk = clean_raw_bike(raw_chunk)
+            if cleaned_station is not None:
+                cleaned_chunk = merging_bike_station(cleaned_chunk,
+                                                     cleaned_station)
+            # continuous index over all chunks, same as the in-memory version
+            cleaned_chunk.index = pd.Index(
+                np.arange(rows_written, rows_written + len(cleaned_chunk)))
+
+            cleaned_chunk.to_csv(output_path,
+                                 mode="w" if parquet_writer is None else "a",
+                                 header=parquet_writer is None,
+                                 encoding=encoding)
+            chunk_table = pa.Table.from_pandas(cleaned_chunk)
+            if parquet_writer is None:
+                parquet_writer = pq.ParquetWriter(cache_path,
+                                                  chunk_table.schema)
+            parquet_writer.write_table(
+                chunk_table.cast(parquet_writer.schema))
+            rows_written += len(cleaned_chunk)
+    finally:
+        if parquet_writer is not None:
+            parquet_writer.close()
+    if parquet_writer is not None:
+        mark_cache_valid(output_path, options=PREPROCESSED_BIKE_OPTIONS)
+    return rows_written
+
+
+@stage
 def clean_station(raw_station: pd.DataFrame):
     """Clean the raw station data: select useful columns and rename
 
@@ -135,6 +326,7 @@ def clean_station(raw_station: pd.DataFrame):
     return station_cleaned
 
 
+@stage
 def merging_bike_station(cleaned_bike_data: pd.DataFrame,
                          cleaned_station_data: pd.DataFrame):
     """adding station location info into bike data
@@ -148,64 +340,148 @@ def merging_bike_station(cleaned_bike_data: pd.DataFrame,
         _type_: pd.Dataframe
     """
 
-    # NOTE "inner join" will automatically drop those records not in station.csv
-    start_station_merge = pd.merge(
-        cleaned_bike_data,
-        cleaned_station_data,
-        how="inner",
-        left_on="from_station_id",
-        right_index=True,
-    )
-    start_plus_end_station_merge = pd.merge(
-        start_station_merge,
-        cleaned_station_data,
-        how="inner",
-        left_on="to_station_id",
-        right_index=True,
-        suffixes=("_from", "_to"),
-    )
-    merging_data = start_plus_end_station_merge.sort_values(
-        "start_time").reset_index(drop=True)
+    # NOTE works like an "inner join": records not in station.csv are dropped.
+    # stations are looked up by id in a dense array instead of two merges.
+    station_lookup = StationLookup(cleaned_station_data)
+    from_rows = station_lookup.row_of(cleaned_bike_data["from_station_id"])
+    to_rows = station_lookup.row_of(cleaned_bike_data["to_station_id"])
+    matched = (from_rows != MISSING_STATION) & (to_rows != MISSING_STATION)
+
+    merging_data = cleaned_bike_data[matched].reset_index(drop=True)
+    from_rows, to_rows = from_rows[matched], to_rows[matched]
+    for end, rows in [("from", from_rows), ("to", to_rows)]:
+        for column in cleaned_station_data.columns:
+            merging_data[f"{column}_{end}"] = station_lookup.take(column, rows)
+
+    # cleaned bike data usually is already ordered by start_time
+    if not merging_data["start_time"].is_monotonic_increasing:
+        merging_data = merging_data.sort_values(
+            "start_time", kind="stable").reset_index(drop=True)
     return merging_data
 
 
-def cal_distance_in_proj_coord(df: gpd.GeoDataFrame, column_name: str):
-    """calculate spatial distance(Euclidean distance) in projected coordinates
-    Make Sure that it's not a geographic coordinate
+@stage
+def save_preprocessed(df: pd.DataFrame,
+                      output_path: str,
+                      read_options: dict = None):
+    """write preprocessed data into csv, and its typed copy into the cache,
+    so that loading it later does not re-parse the csv.
+
+    Args:
+        df (pd.DataFrame): preprocessed data
+        output_path (str): PREPROCESSED_BIKE or PREPROCESSED_STATION
+        read_options (dict, optional): read_csv kwargs of the loader the cache
+        is written for, PREPROCESSED_BIKE_OPTIONS or
+        PREPROCESSED_STATION_OPTIONS. Defaults to None.
+    """
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    df.to_csv(output_path, encoding=Project_Configs.ENCODING.value)
+    write_cache(df, output_path, options=read_options)
+
+
+@stage
+def load_preprocessed_bike(
+        bike_path: str = Project_Configs.PREPROCESSED_BIKE.value):
+    """load preprocessed bike data with int ids and datetime64 start/end time.
+
+    Args:
+        bike_path (str, optional): preprocessed bike data.
+        Defaults to Project_Configs.PREPROCESSED_BIKE.
+
+    Returns:
+        _type_: pd.Dataframe
+    """
+    return read_csv_cached(bike_path, **PREPROCESSED_BIKE_OPTIONS)
+
+
+@stage
+def load_preprocessed_station(
+        station_path: str = Project_Configs.PREPROCESSED_STATION.value):
+    """load preprocessed station data, indexed by station_id.
+
+    Args:
+        station_path (str, optional): preprocessed station data.
+        Defaults to Project_Configs.PREPROCESSED_STATION.
+
+    Returns:
+        _type_: pd.Dataframe
+    """
+    return read_csv_cached(station_path, **PREPROCESSED_STATION_OPTIONS)
+
+
+def _projected_coordinates(df: pd.DataFrame):
+    # x_from, y_from, x_to, y_to of projected trips
+    if "x_from" in df:
+        return (df["x_from"], df["y_from"], df["x_to"], df["y_to"])
+    return (*point_coordinates(df["from_point"]),
+            *point_coordinates(df["to_point"]))
+
+
+@stage
+def cal_distance_in_proj_coord(df: gpd.GeoDataFrame,
+                               column_name: str,
+                               metric: str = "euclidean",
+                               crs: int = Project_Configs.PROJECT_CRS.value):
+    """calculate spatial distance of each trip, vectorized over coordinate
+    arrays (see utils/distance.py).
+    "euclidean" & "manhattan" use the projected x_from/y_from/x_to/y_to
+    (or from_point/to_point), make sure that it's not a geographic coordinate.
+    "haversine" uses lon_from/lat_from/lon_to/lat_to in degrees, or (after
+    convert_coordinate dropped them) the projected coordinates transformed
+    back from crs to epsg:4326.
 
     Args:
         df (gpd.GeoDataFrame): geodataframe for calculating spatial distance
-        column_name (str): _description_
+        column_name (str): field storing the distance
+        metric (str, optional): "euclidean", "manhattan" or "haversine".
+        Defaults to "euclidean".
+        crs (int, optional): epsg of the projected coordinates, for
+        "haversine" without lon/lat fields. Defaults to
+        Project_Configs.PROJECT_CRS.
 
     Returns:
-        _type_: _description_
+        _type_: df with the distance field
     """
-    df[column_name] = df.apply(
-        lambda x: x["from_point"].distance(x["to_point"]), axis=1)
+    if metric == "haversine" and "lon_from" in df:
+        coordinates = (df["lon_from"], df["lat_from"], df["lon_to"],
+                       df["lat_to"])
+    elif metric == "haversine":
+        from pyproj import Transformer
+        to_lon_lat = Transformer.from_crs(int(crs), 4326,
+                                          always_xy=True).transform
+        x_from, y_from, x_to, y_to = _projected_coordinates(df)
+        coordinates = (*to_lon_lat(np.asarray(x_from), np.asarray(y_from)),
+                       *to_lon_lat(np.asarray(x_to), np.asarray(y_to)))
+    else:
+        coordinates = _projected_coordinates(df)
+    df[column_name] = pairwise_distance(*coordinates, metric=metric)
     return df
 
 
-def convert_coordinate(cleaned_bike: gpd.GeoDataFrame,
+@stage
+def convert_coordinate(cleaned_bike: pd.DataFrame,
                        origin_epsg: int = None,
-                       target_epsg: int = None):
-    """generate from point(geometry) and to point(geometry) and transform epsg using station lon&lat.
+                       target_epsg: int = None,
+                       station_table: pd.DataFrame = None):
+    """transform epsg of the start & end station of each trip.
+    only the distinct stations are projected (see utils/station.py), trips
+    then look up the projected x/y by station id.
 
     Args:
-        cleaned_bike (gpd.GeoDataFrame): bike data (merged with station location data)
+        cleaned_bike (pd.DataFrame): bike data (merged with station location data)
         origin_epsg (int, optional): origin epsg. Defaults to None.
         target_epsg (int, optional): target epsg. Defaults to None.
+        station_table (pd.DataFrame, optional): stations already projected to
+        target_epsg (e.g. load_station_table()), if None, projected from the
+        stations in cleaned_bike. Defaults to None.
 
     Returns:
-        _type_: GeoDataframe with two geometry(from point & to point) per row.
+        _type_: Dataframe with projected <x_from, y_from, x_to, y_to> per row.
     """
-    cleaned_bike["from_point"] = gpd.points_from_xy(
-        cleaned_bike["lon_from"],
-        cleaned_bike["lat_from"],
-        crs=f"epsg:{origin_epsg}").to_crs(f"epsg:{target_epsg}")
-    cleaned_bike["to_point"] = gpd.points_from_xy(
-        cleaned_bike["lon_to"],
-        cleaned_bike["lat_to"],
-        crs=f"epsg:{origin_epsg}").to_crs(f"epsg:{target_epsg}")
+    if station_table is None:
+        station_table = project_stations(stations_of_trips(cleaned_bike),
+                                         origin_epsg, target_epsg)
+    cleaned_bike = attach_station_xy(cleaned_bike, station_table)
 
     bike_with_proj_geom = cleaned_bike.drop(
         ["lon_from", "lat_from", "lon_to", "lat_to"], axis=1)
@@ -0,0 +1,175 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 23:58:14 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+import pandas as pd
+
+# HyperLogLog: 2 ** 14 registers, ~0.8% standard error
+HLL_PRECISION = 14
+
+
+def _column_name(column):
+    # a tuple of columns is profiled as one set of values, e.g. stations
+    # used as origin or destination
+    return column if isinstance(column, str) else "+".join(column)
+
+
+def _bit_length(values):
+    # bit length of uint64 values, exact (each 32-bit half fits a float64)
+    high = (values >> np.uint64(32)).astype("float64")
+    low = (values & np.uint64(0xFFFFFFFF)).astype("float64")
+    return np.where(high > 0,
+                    np.frexp(high)[1] + 32,
+                    np.frexp(low)[1]).astype("int64")
+
+
+def hll_registers(values, precision: int = HLL_PRECISION):
+    """HyperLogLog registers of values (any dtype, hashed by pandas).
+
+    Returns:
+        _type_: np.ndarray int8, length 2 ** precision
+    """
+    registers = np.zeros(1 << precision, dtype="int8")
+    if len(values) == 0:
+        return registers
+    hashes = pd.util.hash_array(np.asarray(values))
+    index = (hashes >> np.uint64(64 - precision)).astype("int64")
+    remaining = hashes << np.uint64(precision)
+    # position of the first 1 bit of the remaining 64 - precision bits
+    rank = np.minimum(64 - _bit_length(remaining), 64 - precision) + 1
+    maximum = pd.Series(rank).groupby(index).max()
+    registers[maximum.index.to_numpy()] = maximum.to_numpy()
+    return registers
+
+
+def hll_estimate(registers):
+    """distinct count estimated from HyperLogLog registers (with the linear
+    counting correction for small counts)."""
+    m = len(registers)
+    alpha = 0.7213 / (1 + 1.079 / m)
+    estimate = alpha * m * m / np.sum(2.0**(-registers.astype("float64")))
+    empty = np.count_nonzero(registers == 0)
+    if estimate <= 2.5 * m and empty > 0:
+        estimate = m * np.log(m / empty)
+    return estimate
+
+
+def _distinct_values(values: pd.Series):
+    # numpy values for hashing, datetimes as int64 nanoseconds (tz-aware
+    # datetimes would be boxed into Timestamp objects), nullable integers
+    # (Int32...) as their numpy dtype instead of objects. values have no NA.
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return values.array.asi8
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype) and hasattr(
+            values.dtype, "numpy_dtype"):
+        return values.to_numpy(dtype=values.dtype.numpy_dtype)
+    return values.to_numpy()
+
+
+def _profile_partition(df: pd.DataFrame, columns, distinct: str):
+    # mergeable partial profile of one chunk / partition
+    partial = {}
+    for column in columns:
+        names = [column] if isinstance(column, str) else list(column)
+        values = [df[name] for name in names]
+        na = sum(int(value.isna().sum()) for value in values)
+        valid = pd.concat([value.dropna() for value in values],
+                          ignore_index=True)
+        if distinct == "exact":
+            distinct_state = pd.unique(_distinct_values(valid))
+        else:
+            distinct_state = hll_registers(_distinct_values(valid))
+        partial[_column_name(column)] = {
+            "count": len(valid),
+            "na": na,
+            "min": valid.min() if len(valid) else None,
+            "max": valid.max() if len(valid) else None,
+            "distinct": distinct_state,
+        }
+    return partial
+
+
+def _count_distinct(uniques):
+    # exact distinct count of the merged per-partition uniques, by a bitmap
+    # for dense integer ids, otherwise by hashing
+    values = np.concatenate(uniques) if uniques else np.empty(0)
+    if len(values) == 0:
+        return 0
+    if values.dtype.kind in "iu":
+        lowest, highest = int(values.min()), int(values.max())
+        if highest - lowest <= 64 * len(values):
+            bitmap = np.zeros(highest - lowest + 1, dtype=bool)
+            bitmap[values - lowest] = True
+            return int(np.count_nonzero(bitmap))
+    return len(pd.unique(values))
+
+
+def _merge_profiles(partials, distinct: str):
+    summary = {}
+    for name in partials[0]:
+        states = [partial[name] for partial in partials]
+        minimums = [s["min"] for s in states if s["min"] is not None]
+        maximums = [s["max"] for s in states if s["max"] is not None]
+        if distinct == "exact":
+            distinct_count = _count_distinct([s["distinct"] for s in states])
+        else:
+            distinct_count = round(
+                hll_estimate(np.max([s["distinct"] for s in states], axis=0)))
+        summary[name] = {
+            "distinct": distinct_count,
+            "count": sum(s["count"] for s in states),
+            "na": sum(s["na"] for s in states),
+            "min": min(minimums) if minimums else None,
+            "max": max(maximums) if maximums else None,
+        }
+    return pd.DataFrame.from_dict(summary, orient="index")
+
+
+def profile_delayed(df, columns: list, distinct: str = "exact"):
+    """lazy profile_columns of a dask dataframe, e.g. to be computed
+    together with other results (see TaxiPipeline / dask.compute).
+
+    Returns:
+        _type_: dask Delayed of the profile pd.Dataframe
+    """
+    import dask
+
+    if distinct not in ("exact", "approximate"):
+        raise TypeError(f"Distinct method {distinct} Not Found.")
+    partials = [
+        dask.delayed(_profile_partition)(partition, columns, distinct)
+        for partition in df.to_delayed()
+    ]
+    return dask.delayed(_merge_profiles)(partials, distinct)
+
+
+def profile_columns(df, columns: list, distinct: str = "exact"):
+    """distinct count, non-NA count, NA count, min and max of several columns
+    in one pass (per partition for dask, then merged), without python sets
+    or lists of the values.
+
+    Args:
+        df (pd.DataFrame | dd.DataFrame): data
+        columns (list): column names; a tuple of columns is profiled as one
+        set of values, e.g. ("from_station_id", "to_station_id").
+        distinct (str, optional): "exact" (hashed uniques, bitmap for dense
+        integer ids) or "approximate" (HyperLogLog, ~0.8% error, fixed
+        memory). Defaults to "exact".
+
+    Raises:
+        TypeError: unknown distinct method
+
+    Returns:
+        _type_: pd.Dataframe, one row per column (tuples are named "a+b"),
+        fields <"distinct","count","na","min","max">
+    """
+    if distinct not in ("exact", "approximate"):
+        raise TypeError(f"Distinct method {distinct} Not Found.")
+    if isinstance(df, pd.DataFrame):
+        return _merge_profiles([_profile_partition(df, columns, distinct)],
+                               distinct)
+    return profile_delayed(df, columns, distinct).compute()
@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 18:41:22 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+from utils.statistic import statistic_names, percentile_name
+
+
+class QuantileSketch:
+    """mergeable quantile sketch (t-digest with vectorized compression).
+    values are summarized by at most ~compression weighted centroids, small
+    ones near both tails, so percentiles of a huge series can be estimated
+    from chunks/partitions that are sketched independently and merged.
+    count, mean, std, min and max are tracked exactly (mean & the sum of
+    squared deviations with Chan's parallel update, no cancellation for
+    large values with a small spread, e.g. epoch times).
+
+    Args:
+        compression (int, optional): upper bound of centroids, larger is more
+        accurate. Defaults to 200.
+    """
+
+    def __init__(self, compression: int = 200):
+        self.compression = compression
+        self.means = np.empty(0)
+        self.weights = np.empty(0)
+        self.count = 0.0
+        self._mean = 0.0
+        # sum of (weighted) squared deviations from the mean
+        self.m2 = 0.0
+        self.min = np.inf
+        self.max = -np.inf
+
+    @classmethod
+    def from_values(cls, values, weights=None, compression: int = 200):
+        """build a sketch of one chunk / partition."""
+        return cls(compression).update(values, weights)
+
+    def update(self, values, weights=None):
+        """add values (NaN are ignored), optionally weighted (e.g. counts).
+
+        Returns:
+            _type_: self
+        """
+        values = np.asarray(values, dtype="float64").ravel()
+        weights = (np.ones_like(values) if weights is None else np.asarray(
+            weights, dtype="float64").ravel())
+        valid = ~np.isnan(values) & (weights > 0)
+        values, weights = values[valid], weights[valid]
+        if len(values) == 0:
+            return self
+
+        count = weights.sum()
+        mean = (values * weights).sum() / count
+        self._add_moments(count, mean, (weights * (values - mean)**2).sum())
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        self._compress(np.concatenate([self.means, values]),
+                       np.concatenate([self.weights, weights]))
+        return self
+
+    def merge(self, other: "QuantileSketch"):
+        """merge another sketch into this one.
+
+        Returns:
+            _type_: self
+        """
+        if other.count == 0:
+            return self
+        self._add_moments(other.count, other._mean, other.m2)
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+        self._compress(np.concatenate([self.means, other.means]),
+                       np.concatenate([self.weights, other.weights]))
+        return self
+
+    def _add_moments(self, count, mean, m2):
+        # Chan et al. pairwise update of count, mean & m2
+        total_count = self.count + count
+        delta = mean - self._mean
+        self._mean += delta * count / total_count
+        self.m2 += m2 + delta**2 * self.count * count / total_count
+        self.count = total_count
+
+    def _compress(self, means, weights):
+        # NOTE centroids are sorted and grouped by the integer part of the
+        # t-digest k1 scale of their cumulative weight, which keeps
+        # centroids near q=0 and q=1 small (accurate tails).
+        order = np.argsort(means, kind="stable")
+        means, weights = means[order], weights[order]
+        cumulative_weights = np.cumsum(weights)
+        quantile_mid = (cumulative_weights - weights / 2) / self.count
+        k_scale = self.compression * (np.arcsin(2 * quantile_mid - 1) / np.pi +
+                                      0.5)
+        bucket = np.minimum(np.floor(k_scale), self.compression).astype("int64")
+
+        bucket_weights = np.bincount(bucket, weights=weights)
+        bucket_totals = np.bincount(bucket, weights=means * weights)
+        non_empty = bucket_weights > 0
+        self.weights = bucket_weights[non_empty]
+        self.means = bucket_totals[non_empty] / self.weights
+
+    def quantile(self, q):
+        """estimated quantile(s), q in [0, 1].
+
+        Returns:
+            _type_: float or np.ndarray, like q
+        """
+        if self.count == 0:
+            return np.full(np.shape(q), np.nan) if np.ndim(q) else np.nan
+        centers = np.cumsum(self.weights) - self.weights / 2
+        positions = np.concatenate([[0], centers, [self.count]])
+        values = np.concatenate([[self.min], self.means, [self.max]])
+        return np.interp(np.asarray(q, dtype="float64") * self.count,
+                         positions, values)
+
+    @property
+    def mean(self):
+        return self._mean if self.count else np.nan
+
+    @property
+    def std(self):
+        # sample standard deviation, same as pd.Series.std
+        if self.count < 2:
+            return np.nan
+        return np.sqrt(self.m2 / (self.count - 1))
+
+    def centroids(self):
+        """(means, weights) of the centroids, a bounded-size weighted sample
+        of the data, e.g. for density plots.
+
+        Returns:
+            _type_: (np.ndarray, np.ndarray)
+        """
+        return self.means.copy(), self.weights.copy()
+
+    def describe(self, percentiles=(0.25, 0.75)):
+        """same statistic as utils.statistic.describe_columns, estimated.
+
+        Returns:
+            _type_: dict, statistic name -> value
+        """
+        statistic = {
+            "Max Value": self.max if self.count else np.nan,
+            "Min Value": self.min if self.count else np.nan,
+            "Mean": self.mean,
+            "Standard Deviation": self.std,
+        }
+        for percentile in [0.5] + list(percentiles):
+            statistic[percentile_name(percentile)] = float(
+                self.quantile(percentile))
+        return {
+            name: statistic[name]
+            for name in statistic_names(percentiles)
+        }
+
+
+def merge_sketches(sketches):
+    """merge sketches of several chunks / partitions into a new sketch."""
+    sketches = list(sketches)
+    merged = QuantileSketch(sketches[0].compression if sketches else 200)
+    for sketch in sketches:
+        merged.merge(sketch)
+    return merged
+
+
+def sketch_dask_series(series, compression: int = 200):
+    """sketch every partition of a dask series and merge them, without
+    collecting the series.
+
+    Args:
+        series (dd.Series): numeric dask series
+        compression (int, optional): Defaults to 200.
+
+    Returns:
+        _type_: dask Delayed of a QuantileSketch, call .compute() (or pass it
+        to dask.compute together with other results).
+    """
+    import dask
+
+    partition_sketches = [
+        dask.delayed(QuantileSketch.from_values)(partition,
+                                                 compression=compression)
+        for partition in series.to_delayed()
+    ]
+    return dask.delayed(merge_sketches)(partition_sketches)
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 17:25:13 2026
+
+@Author: Kingsley
+'''
+
+import hashlib
+import os
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from config.global_vars import Project_Configs
+from utils.cache import cache_is_valid, cache_path_for, write_cache
+from utils.distance import point_coordinates
+
+# row of station ids that are not in the station table
+MISSING_STATION = -1
+
+
+class StationLookup:
+    """dense station_id -> row lookup over a station table.
+    station ids are small non-negative integers, so the lookup is a plain
+    array indexed by id, and joining stations to trips is a single take.
+
+    Args:
+        station_table (pd.DataFrame): station data indexed by station_id
+    """
+
+    def __init__(self, station_table: pd.DataFrame):
+        station_ids = station_table.index.to_numpy(dtype="int64")
+        self.station_table = station_table
+        self.rows = np.full(station_ids.max() + 1 if len(station_ids) else 0,
+                            MISSING_STATION,
+                            dtype="int32")
+        self.rows[station_ids] = np.arange(len(station_ids), dtype="int32")
+
+    def row_of(self, station_ids):
+        """rows of station ids in the station table, MISSING_STATION for
+        unknown ids.
+
+        Returns:
+            _type_: np.ndarray (int32)
+        """
+        station_ids = np.asarray(station_ids, dtype="int64")
+        in_range = (station_ids >= 0) & (station_ids < len(self.rows))
+        return np.where(in_range,
+                        self.rows[np.where(in_range, station_ids, 0)],
+                        MISSING_STATION)
+
+    def take(self, column: str, rows):
+        """values of a station field at the given rows (no missing rows).
+
+        Returns:
+            _type_: np.ndarray
+        """
+        return np.take(self.station_table[column].to_numpy(), rows)
+
+
+def project_stations(cleaned_station: pd.DataFrame,
+                     origin_epsg: int = 4326,
+                     target_epsg: int = Project_Configs.PROJECT_CRS.value):
+    """project station locations once, so that trips can look up their
+    projected coordinates by station id instead of being projected one by one.
+
+    Args:
+        cleaned_station (pd.DataFrame): station data indexed by station_id,
+        with fields <"lon" and "lat">
+        origin_epsg (int, optional): epsg of lon/lat. Defaults to 4326.
+        target_epsg (int, optional): target epsg.
+        Defaults to Project_Configs.PROJECT_CRS.
+
+    Returns:
+        _type_: pd.Dataframe indexed by station_id, fields <lon, lat, x, y>
+    """
+    projected_points = gpd.points_from_xy(
+        cleaned_station["lon"], cleaned_station["lat"],
+        crs=f"epsg:{origin_epsg}").to_crs(f"epsg:{target_epsg}")
+    station_table = cleaned_station[["lon", "lat"]].copy()
+    station_table["x"], station_table["y"] = point_coordinates(
+        projected_points)
+    return station_table
+
+
+def load_station_table(
+        station_path: str = Project_Configs.PREPROCESSED_STATION.value,
+        target_epsg: int = Project_Configs.PROJECT_CRS.value):
+    """projected station table, cached per target epsg and invalidated when
+    the preprocessed station csv changes.
+
+    Args:
+        station_path (str, optional): preprocessed station data.
+        Defaults to Project_Configs.PREPROCESSED_STATION.
+        target_epsg (int, optional): target epsg.
+        Defaults to Project_Configs.PROJECT_CRS.
+
+    Returns:
+        _type_: pd.Dataframe indexed by station_id, fields <lon, lat, x, y>
+    """
+    cache_dir = os.path.join(Project_Configs.CACHE_DIR.value,
+                             f"epsg_{target_epsg}")
+    if cache_is_valid(station_path, cache_dir):
+        return pd.read_parquet(cache_path_for(station_path, cache_dir),
+                               engine="pyarrow")
+    from utils.preprocess import load_preprocessed_station
+    station_table = project_stations(load_preprocessed_station(station_path),
+                                     target_epsg=target_epsg)
+    write_cache(station_table, station_path, cache_dir)
+    return station_table
+
+
+def station_geodataframe(station_table: pd.DataFrame,
+                         target_epsg: int = Project_Configs.PROJECT_CRS.value):
+    """point geometries of a projected station table.
+
+    Returns:
+        _type_: gpd.GeoDataframe indexed by station_id
+    """
+    return gpd.GeoDataFrame(station_table,
+                            geometry=gpd.points_from_xy(station_table["x"],
+                                                        station_table["y"]),
+                            crs=f"epsg:{target_epsg}")
+
+
+def stations_of_trips(bike: pd.DataFrame):
+    """distinct stations (id, lon, lat) appearing in merged trips.
+
+    Args:
+        bike (pd.DataFrame): bike data merged with station location data
+
+    Returns:
+        _type_: pd.Dataframe indexed by station_id, fields <lon, lat>
+    """
+    station_columns = ["station_id", "lon", "lat"]
+    from_stations = bike[["from_station_id", "lon_from", "lat_from"]]
+    to_stations = bike[["to_station_id", "lon_to", "lat_to"]]
+    from_stations.columns, to_stations.columns = (station_columns,
+                                                  station_columns)
+    return pd.concat([from_stations, to_stations]).drop_duplicates(
+        "station_id").set_index("station_id")
+
+
+def attach_station_xy(bike: pd.DataFrame, station_table: pd.DataFrame):
+    """add projected coordinates of start & end station to each trip,
+    looked up by station id (array indexing, no geometry per trip).
+
+    Args:
+        bike (pd.DataFrame): bike data with <from_station_id, to_station_id>
+        station_table (pd.DataFrame): output of project_stations
+
+    Returns:
+        _type_: bike with fields <x_from, y_from, x_to, y_to>
+    """
+    station_lookup = StationLookup(station_table)
+    for end in ["from", "to"]:
+        rows = station_lookup.row_of(bike[f"{end}_station_id"])
+        if (rows == MISSING_STATION).any():
+            raise Exception(f"Data Error: unknown {end}_station_id!")
+        bike[f"x_{end}"] = station_lookup.take("x", rows)
+        bike[f"y_{end}"] = station_lookup.take("y", rows)
+    return bike
+
+
+def content_hash(df: pd.DataFrame):
+    """hash of the content (values & index) of a dataframe."""
+    return hashlib.sha1(
+        pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes()
+    ).hexdigest()
+
+
+class StationContext:
+    """projected station geometries with their departure & arrival counts,
+    shared by all station-level plots of one dataset.
+
+    Args:
+        station_geom (gpd.GeoDataFrame): projected stations indexed by
+        station_id
+        departure_counts (pd.Series): departures per station
+        arrival_counts (pd.Series): arrivals per station
+    """
+
+    def __init__(self, station_geom: gpd.GeoDataFrame,
+                 departure_counts: pd.Series, arrival_counts: pd.Series):
+        self.station_geom = station_geom
+        self.departure_gdf = gpd.GeoDataFrame(
+            departure_counts.to_frame("departure_stations_count").merge(
+                station_geom[["geometry"]], left_index=True,
+                right_index=True),
+            crs=station_geom.crs)
+        self.arrival_gdf = gpd.GeoDataFrame(
+            arrival_counts.to_frame("arrival_stations_count").merge(
+                station_geom[["geometry"]], left_index=True,
+                right_index=True),
+            crs=station_geom.crs)
+
+
+# station contexts already built, keyed by content hash of their inputs
+_STATION_CONTEXTS = {}
+
+
+def build_station_context(station_table: pd.DataFrame,
+                          trip_cube,
+                          target_epsg: int = Project_Configs.PROJECT_CRS.value):
+    """station context of a dataset, built once and reused while the
+    station data and the trip counts stay the same.
+
+    Args:
+        station_table (pd.DataFrame): stations indexed by station_id, either
+        projected (output of project_stations/load_station_table) or with
+        <lon, lat> only
+        trip_cube (TripCube): trip counts of the dataset (utils/cube.py)
+        target_epsg (int, optional): target epsg.
+        Defaults to Project_Configs.PROJECT_CRS.
+
+    Returns:
+        _type_: StationContext
+    """
+    key = (content_hash(station_table), content_hash(trip_cube.counts),
+           str(target_epsg))
+    if key not in _STATION_CONTEXTS:
+        if "x" not in station_table:
+            station_table = project_stations(station_table,
+                                             target_epsg=target_epsg)
+        _STATION_CONTEXTS[key] = StationContext(
+            station_geodataframe(station_table, target_epsg),
+            trip_cube.departures(), trip_cube.arrivals())
+    return _STATION_CONTEXTS[key]
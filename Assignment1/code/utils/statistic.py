@@ -0,0 +1,108 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 18:04:37 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+import pandas as pd
+
+
+def percentile_name(percentile: float):
+    if percentile == 0.5:
+        return "Median"
+    return f"{percentile * 100:g}% Percentile"
+
+
+def statistic_names(percentiles=(0.25, 0.75)):
+    """row names of the summary table, in the order of describe_columns."""
+    percentiles = [p for p in percentiles if p != 0.5]
+    return (["Max Value", "Min Value", "Median", "Mean"] +
+            [percentile_name(p) for p in percentiles] +
+            ["Standard Deviation"])
+
+
+def _describe_sorted(sorted_values, group_starts, group_counts, percentiles):
+    # sorted_values is sorted within each group, so every order statistic
+    # is read at a computed position (linear interpolation like pandas).
+    group_last = group_starts + group_counts - 1
+    statistic = {
+        "Max Value": sorted_values[group_last],
+        "Min Value": sorted_values[group_starts],
+    }
+    for percentile in [0.5] + [p for p in percentiles if p != 0.5]:
+        position = group_starts + percentile * (group_counts - 1)
+        lower = np.floor(position).astype("int64")
+        upper = np.minimum(lower + 1, group_last)
+        statistic[percentile_name(percentile)] = (
+            sorted_values[lower] + (position - lower) *
+            (sorted_values[upper] - sorted_values[lower]))
+    return statistic
+
+
+def describe_columns(df: pd.DataFrame,
+                     columns: list,
+                     percentiles=(0.25, 0.75),
+                     by: str = None):
+    """descriptive statistic (max, min, median, mean, percentiles, std) of
+    several columns, optionally per group.
+    each column is sorted once (within groups), all order statistics are read
+    from the sorted array, mean and std come from grouped sums.
+
+    Args:
+        df (pd.DataFrame): data
+        columns (list): numeric fields to describe
+        percentiles (tuple, optional): percentiles besides the median.
+        Defaults to (0.25, 0.75).
+        by (str, optional): field to group by, e.g. "from_station_id".
+        Defaults to None.
+
+    Returns:
+        _type_: pd.Dataframe, one column per field. rows are the statistic
+        names, or (group, statistic name) if by is given.
+    """
+    if by is None:
+        group_codes = np.zeros(len(df), dtype="int64")
+        groups = pd.Index([None])
+    else:
+        group_codes, groups = pd.factorize(df[by], sort=True)
+    names = statistic_names(percentiles)
+
+    summary = {}
+    for column in columns:
+        values = df[column].to_numpy(dtype="float64")
+        valid = ~np.isnan(values) & (group_codes >= 0)
+        values, codes = values[valid], group_codes[valid]
+
+        if by is None:
+            sorted_values = np.sort(values)
+        else:
+            sorted_values = values[np.lexsort((values, codes))]
+        group_counts = np.bincount(codes, minlength=len(groups))
+        group_starts = np.cumsum(group_counts) - group_counts
+
+        column_summary = {name: np.full(len(groups), np.nan) for name in names}
+        has_values = group_counts > 0
+        for name, statistic in _describe_sorted(
+                sorted_values, group_starts[has_values],
+                group_counts[has_values], percentiles).items():
+            column_summary[name][has_values] = statistic
+
+        with np.errstate(invalid="ignore", divide="ignore"):
+            mean = np.bincount(codes, weights=values,
+                               minlength=len(groups)) / group_counts
+            squared_error = np.bincount(codes,
+                                        weights=(values - mean[codes])**2,
+                                        minlength=len(groups))
+            column_summary["Mean"] = mean
+            column_summary["Standard Deviation"] = np.sqrt(
+                squared_error / (group_counts - 1))
+        summary[column] = np.stack([column_summary[name] for name in names],
+                                   axis=1).ravel()
+
+    if by is None:
+        index = pd.Index(names)
+    else:
+        index = pd.MultiIndex.from_product([groups, names], names=[by, None])
+    return pd.DataFrame(summary, index=index)
@@ -0,0 +1,304 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Mon 10 19 01:34:18 2026
+
+@Author: Kingsley
+'''
+
+import json
+import os
+import numpy as np
+import pandas as pd
+from config.global_vars import Project_Configs
+
+# Chicago (bike stations) & Manhattan (taxi intersections) extents, lon/lat
+CHICAGO_BOUNDS = (-87.80, 41.75, -87.55, 42.00)
+MANHATTAN_BOUNDS = (-74.02, 40.70, -73.93, 40.88)
+
+
+def _chunks(total: int, chunk_size: int):
+    # (chunk number, first row, rows) of total rows
+    for number, first in enumerate(range(0, total, chunk_size)):
+        yield number, first, min(chunk_size, total - first)
+
+
+def _popularity(rng, size: int, skew: float = 0.8):
+    # zipf-like probabilities, a few busy stations / intersections
+    weights = 1 / np.arange(1, size + 1)**skew
+    return rng.permutation(weights / weights.sum())
+
+
+def _sorted_times(rng, rows: int, start: float, end: float):
+    # uniform times in [start, end), sorted
+    return np.sort(rng.uniform(start, end, rows)).astype("int64")
+
+
+def generate_bike_data(output_dir: str = r"./data_raw",
+                       trips: int = 10000,
+                       stations: int = 600,
+                       days: int = 3,
+                       start: str = "2019-07-24",
+                       unknown_station_rate: float = 0.001,
+                       missing_rate: float = 0.01,
+                       seed: int = 0,
+                       chunk_size: int = 1000000):
+    """synthetic chicago_data.csv, station.csv and chicago.geojson with the
+    columns of the raw Divvy data, trips ordered by start_time over
+    [start, start + days) (the task time window is one of the days).
+    written chunk by chunk, so 100M trips do not need 100M rows in memory.
+    the same arguments always give the same files.
+
+    Args:
+        output_dir (str, optional): Defaults to r"./data_raw".
+        trips (int, optional): Defaults to 10000.
+        stations (int, optional): Defaults to 600.
+        days (int, optional): days covered by the trips. Defaults to 3.
+        start (str, optional): first day. Defaults to "2019-07-24".
+        unknown_station_rate (float, optional): trips from stations missing
+        in station.csv. Defaults to 0.001.
+        missing_rate (float, optional): rows with a missing value (gender).
+        Defaults to 0.01.
+        seed (int, optional): Defaults to 0.
+        chunk_size (int, optional): rows written at once. Defaults to 1e6.
+
+    Returns:
+        _type_: dict, name -> path of the written files
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = {
+        "bike": os.path.join(output_dir,
+                             os.path.basename(
+                                 Project_Configs.BIKE_DATA_PATH.value)),
+        "station": os.path.join(
+            output_dir,
+            os.path.basename(Project_Configs.STATION_DATA_PATH.value)),
+        "boundary": os.path.join(
+            output_dir, os.path.basename(Project_Configs.BASE_CHICAGO.value)),
+    }
+
+    # NOTE stations
+    min_lon, min_lat, max_lon, max_lat = CHICAGO_BOUNDS
+    station_ids = np.arange(2, 2 + stations)
+    pd.DataFrame({
+        "data__stations__station_id": station_ids,
+        "data__stations__lon": rng.uniform(min_lon, max_lon, stations),
+        "data__stations__lat": rng.uniform(min_lat, max_lat, stations),
+        "data__stations__name": [f"station {i}" for i in station_ids],
+    }).to_csv(paths["station"], index=False)
+    popularity = _popularity(rng, stations)
+
+    # NOTE trips, each chunk covers its share of the time span
+    first_second = pd.Timestamp(start).value // 10**9
+    span = days * 86400
+    for number, first, rows in _chunks(trips, chunk_size):
+        chunk_rng = np.random.default_rng([seed, number])
+        start_times = _sorted_times(chunk_rng,
+                                    rows,
+                                    first_second + span * first / trips,
+                                    first_second + span *
+                                    (first + rows) / trips)
+        durations = np.round(chunk_rng.lognormal(6.6, 0.7, rows)).astype(
+            "int64")
+        from_stations = chunk_rng.choice(station_ids, rows, p=popularity)
+        to_stations = chunk_rng.choice(station_ids, rows, p=popularity)
+        from_stations[chunk_rng.random(rows) < unknown_station_rate] = (
+            station_ids[-1] + 1)
+        gender = np.where(chunk_rng.random(rows) < 0.7, "Male", "Female")
+        gender = np.where(
+            chunk_rng.random(rows) < missing_rate, None, gender)
+        pd.DataFrame({
+            "trip_id":
+            np.arange(first, first + rows) + 23000000,
+            "start_time":
+            pd.to_datetime(start_times, unit="s").strftime(
+                Project_Configs.DATETIME_FORMAT.value),
+            "end_time":
+            pd.to_datetime(start_times + durations, unit="s").strftime(
+                Project_Configs.DATETIME_FORMAT.value),
+            "bikeid":
+            chunk_rng.integers(1, 6000, rows),
+            "tripduration":
+            durations.astype("float64"),
+            "from_station_id":
+            from_stations,
+            "from_station_name":
+            "from station",
+            "to_station_id":
+            to_stations,
+            "to_station_name":
+            "to station",
+            "usertype":
+            np.where(chunk_rng.random(rows) < 0.8, "Subscriber", "Customer"),
+            "gender":
+            gender,
+            "birthyear":
+            chunk_rng.integers(1950, 2003, rows).astype("float64"),
+        }).to_csv(paths["bike"],
+                  mode="w" if number == 0 else "a",
+                  header=number == 0,
+                  index=False)
+
+    # NOTE boundary, one polygon around the stations
+    boundary = [[min_lon - 0.05, min_lat - 0.05],
+                [max_lon + 0.05, min_lat - 0.05],
+                [max_lon + 0.05, max_lat + 0.05],
+                [min_lon - 0.05, max_lat + 0.05],
+                [min_lon - 0.05, min_lat - 0.05]]
+    with open(paths["boundary"], "w") as f:
+        json.dump(
+            {
+                "type":
+                "FeatureCollection",
+                "features": [{
+                    "type": "Feature",
+                    "properties": {
+                        "name": "chicago"
+                    },
+                    "geometry": {
+                        "type": "Polygon",
+                        "coordinates": [boundary]
+                    }
+                }]
+            }, f)
+    return paths
+
+
+def generate_taxi_data(output_dir: str = r"./raw_data",
+                       trips: int = 10000,
+                       grid: tuple = (60, 20),
+                       taxis: int = 13000,
+                       year: int = 2011,
+                       missing_rate: float = 0.0001,
+                       seed: int = 0,
+                       chunk_size: int = 1000000):
+    """synthetic taxi_id.csv, intersections.csv, roads.csv and taxi_zones.shp
+    shaped like the Assignment 2 data (no header, epoch seconds): a street
+    grid of intersections over Manhattan, roads between neighbouring
+    intersections and trips between popular intersections over one year.
+    written chunk by chunk, the same arguments always give the same files.
+
+    Args:
+        output_dir (str, optional): Defaults to r"./raw_data".
+        trips (int, optional): Defaults to 10000.
+        grid (tuple, optional): (streets, avenues) of the intersection grid.
+        Defaults to (60, 20).
+        taxis (int, optional): Defaults to 13000.
+        year (int, optional): Defaults to 2011.
+        missing_rate (float, optional): trips without drop off intersection.
+        Defaults to 0.0001.
+        seed (int, optional): Defaults to 0.
+        chunk_size (int, optional): rows written at once. Defaults to 1e6.
+
+    Returns:
+        _type_: dict, name -> path of the written files
+    """
+    import geopandas as gpd
+    import shapely
+
+    os.makedirs(output_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    paths = {
+        name: os.path.join(output_dir, f"{name}.csv")
+        for name in ("taxi_id", "intersections", "roads")
+    }
+    paths["zones"] = os.path.join(output_dir, "taxi_zones.shp")
+
+    # NOTE intersections on a grid, roads between grid neighbours
+    min_lon, min_lat, max_lon, max_lat = MANHATTAN_BOUNDS
+    streets, avenues = grid
+    row, column = np.divmod(np.arange(streets * avenues), avenues)
+    intersection_ids = np.arange(1, streets * avenues + 1)
+    latitude = min_lat + (max_lat - min_lat) * row / max(streets - 1, 1)
+    longitude = min_lon + (max_lon - min_lon) * column / max(avenues - 1, 1)
+    pd.DataFrame({
+        "id": intersection_ids,
+        "latitude": latitude,
+        "longitude": longitude
+    }).to_csv(paths["intersections"], index=False, header=False)
+
+    ids = intersection_ids.reshape(streets, avenues)
+    node1 = np.concatenate([ids[:, :-1].ravel(), ids[:-1, :].ravel()])
+    node2 = np.concatenate([ids[:, 1:].ravel(), ids[1:, :].ravel()])
+    segments = shapely.linestrings(
+        np.stack([
+            np.column_stack([longitude[node1 - 1], latitude[node1 - 1]]),
+            np.column_stack([longitude[node2 - 1], latitude[node2 - 1]])
+        ],
+                 axis=1))
+    pd.DataFrame({
+        "node1": node1,
+        "node2": node2,
+        "geom": shapely.to_wkt(segments, rounding_precision=6)
+    }).to_csv(paths["roads"], index=False, header=False)
+
+    # NOTE taxi zones, Manhattan covers the grid
+    zones = gpd.GeoDataFrame(
+        {
+            "zone": ["Manhattan", "Brooklyn"],
+            "borough": ["Manhattan", "Brooklyn"]
+        },
+        geometry=[
+            shapely.box(min_lon - 0.01, min_lat - 0.01, max_lon + 0.01,
+                        max_lat + 0.01),
+            shapely.box(min_lon - 0.01, min_lat - 0.15, max_lon + 0.05,
+                        min_lat - 0.01)
+        ],
+        crs="epsg:4326").to_crs("epsg:2263")
+    zones.to_file(paths["zones"])
+
+    # NOTE trips, each chunk covers its share of the year
+    popularity = _popularity(rng, len(intersection_ids))
+    first_second = pd.Timestamp(f"{year}-01-01",
+                                tz="America/New_York").value // 10**9
+    span = (pd.Timestamp(f"{year + 1}-01-01", tz="America/New_York").value //
+            10**9) - first_second
+    for number, first, rows in _chunks(trips, chunk_size):
+        chunk_rng = np.random.default_rng([seed, number])
+        pick_up = _sorted_times(chunk_rng, rows,
+                                first_second + span * first / trips,
+                                first_second + span * (first + rows) / trips)
+        # most durations are whole minutes, as in the real data
+        durations = np.round(chunk_rng.gamma(2.0, 400.0, rows)).astype("int64")
+        whole_minutes = chunk_rng.random(rows) < 0.8
+        durations[whole_minutes] = np.maximum(
+            durations[whole_minutes] // 60, 1) * 60
+        drop_off_intersection = chunk_rng.choice(intersection_ids,
+                                                 rows,
+                                                 p=popularity).astype(
+                                                     "float64")
+        drop_off_intersection[chunk_rng.random(rows) < missing_rate] = np.nan
+        pd.DataFrame({
+            "taxi_id":
+            chunk_rng.integers(0, taxis, rows),
+            "pick_up_time":
+            pick_up,
+            "drop_off_time":
+            pick_up + durations,
+            "pick_up_intersection":
+            chunk_rng.choice(intersection_ids, rows, p=popularity),
+            "drop_of_intersection":
+            pd.array(drop_off_intersection).astype("Int64"),
+        }).to_csv(paths["taxi_id"],
+                  mode="w" if number == 0 else "a",
+                  header=False,
+                  index=False)
+    return paths
+
+
+if __name__ == "__main__":
+    # from Assignment1/code:
+    # python -m utils.synthetic bike [trips] [output_dir]
+    # python -m utils.synthetic taxi [trips] [output_dir]
+    import sys
+
+    generators = {"bike": generate_bike_data, "taxi": generate_taxi_data}
+    kind = sys.argv[1] if len(sys.argv) > 1 else "bike"
+    if kind not in generators:
+        raise TypeError(f"Dataset {kind} Not Found.")
+    arguments = {}
+    if len(sys.argv) > 2:
+        arguments["trips"] = int(float(sys.argv[2]))
+    if len(sys.argv) > 3:
+        arguments["output_dir"] = sys.argv[3]
+    print(generators[kind](**arguments))
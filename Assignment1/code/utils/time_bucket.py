@@ -0,0 +1,113 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 22:47:31 2026
+
+@Author: Kingsley
+'''
+
+import numpy as np
+import pandas as pd
+
+SECONDS_PER_DAY = 86400
+SECONDS_PER_HOUR = 3600
+
+
+def _utc_offsets(tz: str, utc_times: pd.DatetimeIndex):
+    # utc offset (seconds) of tz at each utc time
+    wall_times = utc_times.tz_convert(tz).tz_localize(None)
+    return (wall_times.asi8 - utc_times.tz_localize(None).asi8) // 10**9
+
+
+class LocalTimeBuckets:
+    """local date & hour of times as compact integer codes: day = days since
+    1970-01-01 (local date, int16, until 2059) and hour = 0-23 (int8).
+    the DST transitions of tz are computed once (hourly scan of
+    [start, end], refined to the minute), afterwards every time is shifted
+    by the offset found with a binary search, instead of tz_convert and
+    strftime on every row.
+
+    Args:
+        tz (str, optional): target timezone, e.g. "America/New_York".
+        None if only naive (already local) times are bucketed.
+        Defaults to None.
+        start (str, optional): first utc time the offsets are computed
+        for. Defaults to "1970-01-01".
+        end (str, optional): last utc time. Defaults to "2038-01-19".
+    """
+
+    def __init__(self,
+                 tz: str = None,
+                 start: str = "1970-01-01",
+                 end: str = "2038-01-19"):
+        self.tz = tz
+        # transitions[i]: utc epoch second from which offsets[i] applies
+        self.transitions = np.zeros(1, dtype="int64")
+        self.offsets = np.zeros(1, dtype="int64")
+        if tz is None:
+            return
+
+        hours = pd.date_range(start, end, freq="H", tz="UTC")
+        hour_offsets = _utc_offsets(tz, hours)
+        transitions = [hours[0].value // 10**9]
+        offsets = [hour_offsets[0]]
+        for i in np.flatnonzero(np.diff(hour_offsets)):
+            minutes = pd.date_range(hours[i], hours[i + 1], freq="min")
+            changed = np.argmax(_utc_offsets(tz, minutes) != hour_offsets[i])
+            transitions.append(minutes[changed].value // 10**9)
+            offsets.append(hour_offsets[i + 1])
+        self.transitions = np.asarray(transitions, dtype="int64")
+        self.offsets = np.asarray(offsets, dtype="int64")
+
+    def local_seconds(self, times):
+        """local wall time of times, in seconds since 1970-01-01 00:00.
+
+        Args:
+            times: tz-aware datetimes (converted to tz), naive datetimes
+            (already local, kept) or epoch seconds (utc, converted to tz)
+
+        Returns:
+            _type_: (np.ndarray int64, np.ndarray bool of valid times)
+        """
+        if pd.api.types.is_datetime64_any_dtype(times):
+            times = pd.Series(times)
+            valid = times.notna().to_numpy()
+            seconds = times.array.asi8 // 10**9
+            if times.dt.tz is None:
+                return seconds, valid
+        else:
+            seconds = np.asarray(times, dtype="float64")
+            valid = ~np.isnan(seconds)
+            seconds = np.where(valid, seconds, 0).astype("int64")
+        position = np.maximum(
+            np.searchsorted(self.transitions, seconds, side="right") - 1, 0)
+        return seconds + self.offsets[position], valid
+
+    def _as_series(self, codes, times, name):
+        index = times.index if isinstance(times, pd.Series) else None
+        return pd.Series(codes, index=index, name=name)
+
+    def day_codes(self, times, name: str = "trip_day"):
+        """local date codes (int16, days since 1970-01-01, -1 for missing
+        times), indexed like times."""
+        seconds, valid = self.local_seconds(times)
+        codes = np.where(valid, seconds // SECONDS_PER_DAY, -1)
+        return self._as_series(codes.astype("int16"), times, name)
+
+    def hour_codes(self, times, name: str = "trip_hour"):
+        """local hour (int8, 0-23, -1 for missing times), indexed like
+        times."""
+        seconds, valid = self.local_seconds(times)
+        codes = np.where(valid,
+                         seconds % SECONDS_PER_DAY // SECONDS_PER_HOUR, -1)
+        return self._as_series(codes.astype("int8"), times, name)
+
+    @staticmethod
+    def day_code(date):
+        """code of a local date, e.g. day_code("2011-05-01"), for filtering
+        day codes with an integer compare."""
+        return int(pd.Timestamp(date).value // 10**9 // SECONDS_PER_DAY)
+
+    @staticmethod
+    def dates(day_codes):
+        """local dates (datetime64 at midnight) of day codes."""
+        return pd.to_datetime(np.asarray(day_codes, dtype="int64"), unit="D")
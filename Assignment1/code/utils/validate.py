@@ -6,10 +6,12 @@ Created on Wed 09 20 09:30:37 2023
 '''
 
 from config.global_vars import Project_Configs
+from utils.instrument import stage
 import pandas as pd
 import geopandas as gpd
 
 
+@stage
 def time_window_is_correct(df: pd.DataFrame, date: str = None):
     """check date: if unexpected datetime exist in dataframe, raise error.
 
@@ -34,6 +36,7 @@ def time_window_is_correct(df: pd.DataFrame, date: str = None):
         return True
 
 
+@stage
 def crs_is_correct(gdf: gpd.GeoDataFrame, crs: int = None):
     """check crs: if unexpected crs comes, return false.
 
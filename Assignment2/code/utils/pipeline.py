@@ -0,0 +1,64 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 23:34:09 2026
+
+@Author: Kingsley
+'''
+
+from utils.instrument import dask_task_stream, stage
+
+
+class TaxiPipeline:
+    """the taxi trips (raw_taxi_df) parsed once and kept in the (distributed)
+    memory, plus a queue of aggregations computed together.
+    aggregations added with add() are lazy; compute() evaluates all of them
+    in a single dask.compute, so they share one pass over the partitions.
+
+    Args:
+        trips (dd.DataFrame): lazy trips, e.g. load_taxi_dataset()
+    """
+
+    def __init__(self, trips):
+        self.trips = trips
+        self.pending = {}
+        self.results = {}
+
+    @stage
+    def persist(self):
+        """load the trips into worker memory once, every later computation
+        starts from there instead of the files. with dask.distributed the
+        workers spill partitions to disk when their memory limit is reached.
+
+        Returns:
+            _type_: self
+        """
+        self.trips = self.trips.persist()
+        return self
+
+    def add(self, name: str, aggregation):
+        """queue a lazy aggregation (dask collection or delayed) of the trips.
+
+        Returns:
+            _type_: self
+        """
+        self.pending[name] = aggregation
+        return self
+
+    @stage
+    def compute(self):
+        """compute all queued aggregations in one dask.compute.
+
+        Returns:
+            _type_: dict, name -> result (also kept in self.results)
+        """
+        import dask
+
+        names = list(self.pending)
+        with dask_task_stream("TaxiPipeline.compute"):
+            values = dask.compute(*self.pending.values())
+        self.results.update(zip(names, values))
+        self.pending = {}
+        return {name: self.results[name] for name in names}
+
+    def __getitem__(self, name: str):
+        return self.results[name]
@@ -0,0 +1,338 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 21:58:40 2026
+
+@Author: Kingsley
+'''
+
+import hashlib
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+import shapely
+from scipy import sparse
+from scipy.sparse.csgraph import dijkstra
+from utils.cache import source_fingerprint
+from utils.trip_distance import (PairDistances, intersection_coordinates,
+                                 pair_keys, unique_intersections)
+
+ROAD_COLUMNS = ["node1", "node2", "geom"]
+INTERSECTION_COLUMNS = ["id", "latitude", "longitude"]
+
+
+def read_roads(roads_path: str = r"./raw_data/roads.csv"):
+    return pd.read_csv(roads_path, index_col=None, names=ROAD_COLUMNS)
+
+
+def read_intersections(
+        intersections_path: str = r"./raw_data/intersections.csv"):
+    return pd.read_csv(intersections_path, names=INTERSECTION_COLUMNS)
+
+
+def road_segments(roads: pd.DataFrame, intersections: pd.DataFrame):
+    """straight road segments node1 -> node2, built at once.
+    road nodes are looked up by their dense position in the intersection
+    table, and all segments come from one shapely.linestrings call on a
+    (roads, 2, 2) coordinate array. roads with an unknown node are dropped
+    (as the inner merges did), duplicated intersection ids are looked up
+    by their first row (see unique_intersections).
+
+    Args:
+        roads (pd.DataFrame): fields <"node1","node2">
+        intersections (pd.DataFrame): fields <"id","latitude","longitude">
+
+    Returns:
+        _type_: gpd.GeoDataFrame, fields <"node1","node2","geometry">,
+        epsg:4326
+    """
+    intersections = unique_intersections(intersections)
+    node_index = pd.Index(intersections["id"])
+    start = node_index.get_indexer(roads["node1"])
+    end = node_index.get_indexer(roads["node2"])
+    known = (start >= 0) & (end >= 0)
+    start, end = start[known], end[known]
+
+    node_coordinates = intersections[["longitude",
+                                      "latitude"]].to_numpy(dtype="float64")
+    segment_coordinates = np.stack(
+        [node_coordinates[start], node_coordinates[end]], axis=1)
+    return gpd.GeoDataFrame(
+        {
+            "node1": roads["node1"].to_numpy()[known],
+            "node2": roads["node2"].to_numpy()[known],
+        },
+        geometry=shapely.linestrings(segment_coordinates),
+        crs="epsg:4326")
+
+
+def load_road_segments(
+        roads_path: str = r"./raw_data/roads.csv",
+        intersections_path: str = r"./raw_data/intersections.csv",
+        cache_dir: str = r"./cleaned_data/cache"):
+    """road segments (see road_segments), cached as geoparquet. the cache is
+    rebuilt only when roads.csv or intersections.csv changes (size & mtime).
+
+    Returns:
+        _type_: gpd.GeoDataFrame, fields <"node1","node2","geometry">
+    """
+    cache_path = os.path.join(cache_dir, "road_segments.parquet")
+    fingerprint_path = os.path.join(cache_dir, "road_segments.json")
+    fingerprint = {
+        "roads": source_fingerprint(roads_path),
+        "intersections": source_fingerprint(intersections_path),
+    }
+    if os.path.exists(cache_path) and os.path.exists(fingerprint_path):
+        with open(fingerprint_path, "r") as f:
+            if json.load(f) == fingerprint:
+                return gpd.read_parquet(cache_path)
+
+    segments = road_segments(read_roads(roads_path),
+                             read_intersections(intersections_path))
+    os.makedirs(cache_dir, exist_ok=True)
+    segments.to_parquet(cache_path)
+    # NOTE fingerprint after the data, an interrupted write is never valid
+    with open(fingerprint_path, "w") as f:
+        json.dump(fingerprint, f)
+    return segments
+
+
+class RoadGraph:
+    """road network as a sparse (CSR) graph over a dense index of the
+    intersection ids, edge weights are the lengths of the road segments
+    (projected coordinates). shortest path distances are computed by
+    dijkstra from a batch of origins at once (one row per origin), batches
+    are spread over processes.
+
+    Args:
+        ids (np.ndarray): sorted intersection ids of the dense index
+        graph (sparse.csr_matrix): edge lengths, (len(ids), len(ids))
+        directed (bool, optional): roads are one-way node1 -> node2.
+        Defaults to False.
+    """
+
+    def __init__(self,
+                 ids: np.ndarray,
+                 graph: sparse.csr_matrix,
+                 directed: bool = False):
+        self.ids = np.asarray(ids, dtype="int64")
+        self.graph = graph
+        self.directed = directed
+
+    @classmethod
+    def from_tables(cls,
+                    roads: pd.DataFrame,
+                    intersections: pd.DataFrame,
+                    crs: str = "epsg:2263",
+                    directed: bool = False):
+        """graph of the roads, roads with an unknown node are dropped.
+
+        Args:
+            roads (pd.DataFrame): fields <"node1","node2">
+            intersections (pd.DataFrame): fields <"id","latitude","longitude">
+            crs (str, optional): projected crs of the edge lengths.
+            Defaults to "epsg:2263" (feet).
+            directed (bool, optional): Defaults to False.
+
+        Returns:
+            _type_: RoadGraph
+        """
+        coordinates = intersection_coordinates(intersections,
+                                               crs).sort_index()
+        ids = coordinates.index.to_numpy()
+        node_index = pd.Index(ids)
+        start = node_index.get_indexer(roads["node1"])
+        end = node_index.get_indexer(roads["node2"])
+        known = (start >= 0) & (end >= 0) & (start != end)
+        start, end = start[known], end[known]
+        x, y = coordinates["x"].to_numpy(), coordinates["y"].to_numpy()
+        length = np.hypot(x[end] - x[start], y[end] - y[start])
+
+        # parallel roads: only the shortest one counts (a sparse matrix
+        # would add them up)
+        edges = pd.DataFrame({
+            "start": start,
+            "end": end,
+            "length": length
+        }).sort_values("length").drop_duplicates(["start", "end"])
+        graph = sparse.csr_matrix(
+            (edges["length"].to_numpy(),
+             (edges["start"].to_numpy(), edges["end"].to_numpy())),
+            shape=(len(ids), len(ids)))
+        return cls(ids, graph, directed)
+
+    @property
+    def fingerprint(self):
+        """hash of the graph, distances cached for another graph are
+        invalid."""
+        digest = hashlib.sha1()
+        for array in (self.ids, self.graph.indptr, self.graph.indices,
+                      self.graph.data):
+            digest.update(np.ascontiguousarray(array).tobytes())
+        digest.update(str(self.directed).encode())
+        return digest.hexdigest()
+
+    def _positions(self, node_ids):
+        position = np.searchsorted(self.ids, node_ids)
+        position = np.minimum(position, len(self.ids) - 1)
+        return np.where(self.ids[position] == node_ids, position, -1)
+
+    def _batch_distances(self, origins, destinations):
+        # dijkstra from the distinct origins of the batch, then the
+        # distance of each pair is read from its origin's row
+        sources, rows = np.unique(origins, return_inverse=True)
+        distances = dijkstra(self.graph,
+                             directed=self.directed,
+                             indices=sources)
+        return distances[rows, destinations]
+
+    def shortest_distances(self,
+                           origins,
+                           destinations,
+                           batch_size: int = None,
+                           processes: int = None):
+        """shortest path distance of every (origin, destination) pair, in
+        the unit of the crs. pairs are grouped by origin, each batch of
+        origins is one multi-source dijkstra call.
+
+        Args:
+            origins (array-like): origin intersection ids
+            destinations (array-like): destination intersection ids
+            batch_size (int, optional): origins per dijkstra call.
+            Defaults to None (a few batches per process, at most about
+            64 MB of distances per call).
+            processes (int, optional): worker processes. Defaults to None
+            (os.cpu_count()), 1 computes in this process.
+
+        Returns:
+            _type_: np.ndarray, NaN for unknown ids / unreachable pairs
+        """
+        origins = self._positions(np.asarray(origins, dtype="int64"))
+        destinations = self._positions(
+            np.asarray(destinations, dtype="int64"))
+        result = np.full(len(origins), np.nan)
+        valid = np.flatnonzero((origins >= 0) & (destinations >= 0))
+        if len(valid) == 0:
+            return result
+
+        # pairs sorted by origin, split so that every batch has at most
+        # batch_size distinct origins
+        valid = valid[np.argsort(origins[valid], kind="stable")]
+        first_of_origin = np.flatnonzero(
+            np.diff(origins[valid], prepend=-1) != 0)
+        if batch_size is None:
+            # a few batches per process, each at most ~64 MB of distances
+            workers = processes or os.cpu_count() or 1
+            batch_size = max(
+                1,
+                min((64 << 20) // (8 * len(self.ids)),
+                    len(first_of_origin) // (4 * workers)))
+        splits = first_of_origin[batch_size::batch_size]
+        batches = [(origins[part], destinations[part])
+                   for part in np.split(valid, splits)]
+
+        if processes == 1 or len(batches) == 1:
+            distances = [self._batch_distances(*batch) for batch in batches]
+        else:
+            with ProcessPoolExecutor(max_workers=processes,
+                                     initializer=_set_worker_graph,
+                                     initargs=(self, )) as executor:
+                distances = list(executor.map(_worker_batch_distances,
+                                              batches))
+        distances = np.concatenate(distances)
+        result[valid] = np.where(np.isinf(distances), np.nan, distances)
+        return result
+
+
+# graph of a worker process, sent once per worker instead of per batch
+_WORKER_GRAPH = None
+
+
+def _set_worker_graph(graph: RoadGraph):
+    global _WORKER_GRAPH
+    _WORKER_GRAPH = graph
+
+
+def _worker_batch_distances(batch):
+    return _WORKER_GRAPH._batch_distances(*batch)
+
+
+def load_road_graph(roads_path: str = r"./raw_data/roads.csv",
+                    intersections_path: str = r"./raw_data/intersections.csv",
+                    directed: bool = False):
+    """RoadGraph of roads.csv / intersections.csv (see
+    RoadGraph.from_tables)."""
+    return RoadGraph.from_tables(read_roads(roads_path),
+                                 read_intersections(intersections_path),
+                                 directed=directed)
+
+
+def cached_shortest_distances(graph: RoadGraph,
+                              origins,
+                              destinations,
+                              cache_dir: str = r"./cleaned_data/cache",
+                              processes: int = None):
+    """shortest_distances of the pairs, each distinct pair is computed once
+    and kept in an on-disk cache (parquet), later calls only compute the
+    pairs that are not cached yet. the cache is dropped when the graph
+    changes (see RoadGraph.fingerprint).
+
+    Returns:
+        _type_: np.ndarray, aligned with origins / destinations
+    """
+    cache_path = os.path.join(cache_dir, "network_distances.parquet")
+    fingerprint_path = os.path.join(cache_dir, "network_distances.json")
+    fingerprint = {"graph": graph.fingerprint}
+    cached = pd.DataFrame({
+        "key": pd.Series(dtype="int64"),
+        "distance": pd.Series(dtype="float64")
+    })
+    if os.path.exists(cache_path) and os.path.exists(fingerprint_path):
+        with open(fingerprint_path, "r") as f:
+            if json.load(f) == fingerprint:
+                cached = pd.read_parquet(cache_path, engine="pyarrow")
+
+    keys = pair_keys(origins, destinations)
+    missing = np.setdiff1d(keys, cached["key"].to_numpy())
+    if len(missing):
+        computed = pd.DataFrame({
+            "key":
+            missing,
+            "distance":
+            graph.shortest_distances(missing >> 32,
+                                     missing & 0xFFFFFFFF,
+                                     processes=processes)
+        })
+        cached = pd.concat([cached, computed]).sort_values(
+            "key", ignore_index=True)
+        os.makedirs(cache_dir, exist_ok=True)
+        if os.path.exists(fingerprint_path):
+            os.remove(fingerprint_path)
+        cached.to_parquet(cache_path, engine="pyarrow", index=False)
+        # NOTE fingerprint after the data, an interrupted write is never valid
+        with open(fingerprint_path, "w") as f:
+            json.dump(fingerprint, f)
+
+    cached_keys = cached["key"].to_numpy()
+    return cached["distance"].to_numpy()[np.searchsorted(cached_keys, keys)]
+
+
+def network_pair_distances(od,
+                           graph: RoadGraph,
+                           cache_dir: str = r"./cleaned_data/cache",
+                           processes: int = None):
+    """PairDistances (utils/trip_distance.py) of the non-zero pairs of an
+    OD matrix, with road network distances instead of straight lines.
+
+    Returns:
+        _type_: PairDistances
+    """
+    pairs = od.to_frame().groupby([od.origin, od.destination],
+                                  as_index=False)["trips"].sum()
+    pairs["distance"] = cached_shortest_distances(graph,
+                                                  pairs[od.origin],
+                                                  pairs[od.destination],
+                                                  cache_dir, processes)
+    return PairDistances(pairs, od.origin, od.destination)
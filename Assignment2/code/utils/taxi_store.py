@@ -0,0 +1,174 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Sun 10 18 23:10:52 2026
+
+@Author: Kingsley
+'''
+
+import json
+import os
+import shutil
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pv
+import pyarrow.dataset as ds
+from utils.cache import source_fingerprint
+from utils.time_bucket import LocalTimeBuckets
+
+TAXI_COLUMNS = [
+    "taxi_id", "pick_up_time", "drop_off_time", "pick_up_intersection",
+    "drop_of_intersection"
+]
+# compact dtypes of the dataset, timestamps are utc
+TAXI_SCHEMA = pa.schema([
+    ("taxi_id", pa.int32()),
+    ("pick_up_time", pa.timestamp("ns", tz="UTC")),
+    ("drop_off_time", pa.timestamp("ns", tz="UTC")),
+    ("pick_up_intersection", pa.uint32()),
+    ("drop_of_intersection", pa.uint32()),
+    ("trip_day", pa.int16()),
+])
+# partition key: local date of departure, days since 1970-01-01
+# (see utils/time_bucket.py)
+DAY_PARTITIONING = ds.partitioning(pa.schema([("trip_day", pa.int16())]),
+                                   flavor="hive")
+
+
+def _typed_batches(csv_path: str, time_buckets: LocalTimeBuckets,
+                   block_size: int):
+    reader = pv.open_csv(
+        csv_path,
+        read_options=pv.ReadOptions(column_names=TAXI_COLUMNS,
+                                    block_size=block_size),
+        convert_options=pv.ConvertOptions(
+            column_types={column: pa.int64()
+                          for column in TAXI_COLUMNS}))
+    for batch in reader:
+        pick_up_seconds = batch.column("pick_up_time")
+        trip_day = time_buckets.day_codes(
+            pick_up_seconds.to_numpy(zero_copy_only=False)).to_numpy()
+        yield pa.RecordBatch.from_arrays([
+            batch.column("taxi_id").cast(pa.int32()),
+            pc.multiply(pick_up_seconds,
+                        10**9).cast(pa.timestamp("ns", tz="UTC")),
+            pc.multiply(batch.column("drop_off_time"),
+                        10**9).cast(pa.timestamp("ns", tz="UTC")),
+            batch.column("pick_up_intersection").cast(pa.uint32()),
+            batch.column("drop_of_intersection").cast(pa.uint32()),
+            pa.array(trip_day, type=pa.int16()),
+        ],
+                                         schema=TAXI_SCHEMA)
+
+
+def _marker_path(dataset_path: str):
+    # sidecar recording which csv a complete dataset was ingested from
+    return os.path.normpath(dataset_path) + ".json"
+
+
+def taxi_dataset_is_current(csv_path: str = r"./raw_data/taxi_id.csv",
+                            dataset_path: str = r"./cleaned_data/taxi_parquet"):
+    """check whether dataset_path is a complete ingest of the current csv
+    (size & mtime). an interrupted ingest or a changed csv is not current.
+
+    Returns:
+        _type_: bool
+    """
+    if not (os.path.isdir(dataset_path)
+            and os.path.exists(_marker_path(dataset_path))):
+        return False
+    with open(_marker_path(dataset_path), "r") as f:
+        return json.load(f) == source_fingerprint(csv_path)
+
+
+def ingest_taxi_csv(csv_path: str = r"./raw_data/taxi_id.csv",
+                    dataset_path: str = r"./cleaned_data/taxi_parquet",
+                    time_buckets: LocalTimeBuckets = None,
+                    block_size: int = 64 << 20):
+    """one-time conversion of the raw taxi csv (epoch seconds) into a parquet
+    dataset partitioned by local date (dataset_path/trip_day=<code>/...),
+    streamed block by block. columns get compact dtypes (int32 taxi_id,
+    uint32 intersections, utc timestamps) and every row group stores
+    min/max statistics.
+    the dataset is written into <dataset_path>.partial and renamed when
+    complete, then marked with the csv fingerprint (taxi_dataset_is_current),
+    so an interrupted ingest never looks like a complete one.
+
+    Args:
+        csv_path (str, optional): Defaults to r"./raw_data/taxi_id.csv".
+        dataset_path (str, optional):
+        Defaults to r"./cleaned_data/taxi_parquet".
+        time_buckets (LocalTimeBuckets, optional): local time of the trips.
+        Defaults to None (America/New_York).
+        block_size (int, optional): bytes of csv parsed at once.
+        Defaults to 64 MB.
+    """
+    if time_buckets is None:
+        time_buckets = LocalTimeBuckets("America/New_York")
+    dataset_path = os.path.normpath(dataset_path)
+    partial_path = dataset_path + ".partial"
+    if os.path.exists(partial_path):
+        # left by an interrupted ingest
+        shutil.rmtree(partial_path)
+    ds.write_dataset(_typed_batches(csv_path, time_buckets, block_size),
+                     partial_path,
+                     schema=TAXI_SCHEMA,
+                     format="parquet",
+                     partitioning=DAY_PARTITIONING,
+                     existing_data_behavior="delete_matching",
+                     min_rows_per_group=1 << 17,
+                     max_rows_per_group=1 << 20,
+                     file_options=ds.ParquetFileFormat().make_write_options(
+                         compression="snappy", write_statistics=True))
+
+    # NOTE marker is removed before and written after the swap, a crash in
+    # between leaves no marker and the next session ingests again
+    if os.path.exists(_marker_path(dataset_path)):
+        os.remove(_marker_path(dataset_path))
+    if os.path.exists(dataset_path):
+        shutil.rmtree(dataset_path)
+    os.replace(partial_path, dataset_path)
+    with open(_marker_path(dataset_path), "w") as f:
+        json.dump(source_fingerprint(csv_path), f)
+
+
+def load_taxi_dataset(dataset_path: str = r"./cleaned_data/taxi_parquet",
+                      dates: list = None,
+                      columns: list = None):
+    """lazy dask dataframe of the ingested trips. if dates are given, only
+    the partitions of these local dates are read (partition pruning).
+
+    Args:
+        dataset_path (str, optional):
+        Defaults to r"./cleaned_data/taxi_parquet".
+        dates (list, optional): local dates, e.g. ["2011-05-01"].
+        Defaults to None (all dates).
+        columns (list, optional): columns to read. Defaults to None (all).
+
+    Raises:
+        FileNotFoundError: the dataset is not ingested (see ingest_taxi_csv)
+
+    Returns:
+        _type_: dd.DataFrame
+    """
+    import dask.dataframe as dd
+
+    if not os.path.exists(dataset_path):
+        raise FileNotFoundError(
+            f"{os.path.abspath(dataset_path)} not found.")
+    filters = None
+    if dates is not None:
+        filters = [("trip_day", "in",
+                    [LocalTimeBuckets.day_code(date) for date in dates])]
+    return dd.read_parquet(dataset_path,
+                           engine="pyarrow",
+                           columns=columns,
+                           filters=filters,
+                           dataset={"partitioning": DAY_PARTITIONING})
+
+
+if __name__ == "__main__":
+    # from Assignment2/code, with Assignment1/code on PYTHONPATH:
+    # python -m utils.taxi_store [csv_path] [dataset_path]
+    import sys
+
+    ingest_taxi_csv(*sys.argv[1:3])
@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+'''
+Created on Mon 10 19 00:52:06 2026
+
+@Author: Kingsley
+'''
+
+import warnings
+import numpy as np
+import pandas as pd
+import geopandas as gpd
+from utils.distance import pairwise_distance, point_coordinates
+from utils.kde import BinnedDensity
+from utils.sketch import QuantileSketch
+
+
+def unique_intersections(intersections: pd.DataFrame):
+    """intersection table with one row per id, the first one of duplicated
+    ids is kept (with a warning), so ids can be looked up by position.
+
+    Returns:
+        _type_: pd.DataFrame
+    """
+    duplicated = intersections["id"].duplicated()
+    if duplicated.any():
+        warnings.warn(f"{duplicated.sum()} duplicated intersection ids, "
+                      f"the first row of each id is used.")
+        intersections = intersections[~duplicated]
+    return intersections
+
+
+def intersection_coordinates(intersections: pd.DataFrame,
+                             crs: str = "epsg:2263"):
+    """projected coordinates of the intersections (see unique_intersections).
+
+    Args:
+        intersections (pd.DataFrame): fields <"id","latitude","longitude">
+        crs (str, optional): projected crs. Defaults to "epsg:2263" (feet).
+
+    Returns:
+        _type_: pd.DataFrame indexed by "id", fields <"x","y">
+    """
+    intersections = unique_intersections(intersections)
+    points = gpd.GeoSeries(gpd.points_from_xy(intersections["longitude"],
+                                              intersections["latitude"]),
+                           crs="epsg:4326").to_crs(crs)
+    x, y = point_coordinates(points.values)
+    return pd.DataFrame({
+        "x": x,
+        "y": y
+    },
+                        index=pd.Index(intersections["id"].to_numpy("int64"),
+                                       name="id"))
+
+
+def pair_keys(origins, destinations):
+    """one sortable int64 key per (origin, destination) pair, for ids below
+    2 ** 31: origin << 32 | destination."""
+    return (np.asarray(origins, dtype="int64") << 32) | np.asarray(
+        destinations, dtype="int64")
+
+
+class PairDistances:
+    """distance of every distinct origin-destination pair, with the number of
+    trips of the pair. distances are computed once per pair (not per trip),
+    statistics of all trips are weighted by the trip counts and per-trip
+    distances are looked up by the pair key when needed.
+
+    Args:
+        pairs (pd.DataFrame): fields <origin, destination, "trips",
+        "distance">
+        origin (str, optional): Defaults to "pick_up_intersection".
+        destination (str, optional): Defaults to "drop_of_intersection".
+    """
+
+    def __init__(self,
+                 pairs: pd.DataFrame,
+                 origin: str = "pick_up_intersection",
+                 destination: str = "drop_of_intersection"):
+        self.origin = origin
+        self.destination = destination
+        keys = pair_keys(pairs[origin], pairs[destination])
+        order = np.argsort(keys, kind="stable")
+        self.pairs = pairs.iloc[order].reset_index(drop=True)
+        self.keys = keys[order]
+
+    @classmethod
+    def from_od_matrix(cls,
+                       od,
+                       coordinates: pd.DataFrame,
+                       metric: str = "euclidean"):
+        """distances of the non-zero pairs of an OD matrix
+        (utils/od_matrix.py), from projected coordinates.
+
+        Args:
+            od (ODMatrix): trip counts of the pairs
+            coordinates (pd.DataFrame): see intersection_coordinates
+            metric (str, optional): see utils/distance.py, "euclidean"
+            equals the distance of the projected points.
+            Defaults to "euclidean".
+
+        Returns:
+            _type_: PairDistances
+        """
+        pairs = od.to_frame()
+        pairs = pairs.groupby([od.origin, od.destination],
+                              as_index=False)["trips"].sum()
+        origin_xy = coordinates.reindex(pairs[od.origin])
+        destination_xy = coordinates.reindex(pairs[od.destination])
+        pairs["distance"] = pairwise_distance(origin_xy["x"].to_numpy(),
+                                              origin_xy["y"].to_numpy(),
+                                              destination_xy["x"].to_numpy(),
+                                              destination_xy["y"].to_numpy(),
+                                              metric)
+        return cls(pairs, od.origin, od.destination)
+
+    @property
+    def trips(self):
+        """number of trips of all pairs."""
+        return int(self.pairs["trips"].sum())
+
+    def where(self, mask):
+        """pairs restricted by a boolean mask over self.pairs, e.g.
+        where(distances.pairs["distance"] > 0).
+
+        Returns:
+            _type_: PairDistances
+        """
+        return PairDistances(self.pairs[np.asarray(mask)], self.origin,
+                             self.destination)
+
+    def sketch(self, compression: int = 200):
+        """quantile sketch of the distance of all trips (weighted pairs).
+
+        Returns:
+            _type_: QuantileSketch
+        """
+        return QuantileSketch.from_values(self.pairs["distance"],
+                                          self.pairs["trips"], compression)
+
+    def density(self, lower: float, upper: float, bins: int = 2048):
+        """kernel density of the distance of all trips, the same as adding
+        every trip's distance.
+
+        Returns:
+            _type_: BinnedDensity
+        """
+        return BinnedDensity.from_values(self.pairs["distance"],
+                                         lower,
+                                         upper,
+                                         bins,
+                                         frequencies=self.pairs["trips"])
+
+    def scatter(self, trips: pd.DataFrame):
+        """distance of every trip, looked up by its pair (NaN for pairs not
+        in the table). works per partition on dask dataframes, e.g.
+        trips.map_partitions(distances.scatter).
+
+        Returns:
+            _type_: pd.Series indexed like trips
+        """
+        valid = (trips[self.origin].notna()
+                 & trips[self.destination].notna()).to_numpy()
+        keys = pair_keys(trips[self.origin].fillna(0),
+                         trips[self.destination].fillna(0))
+        position = np.minimum(np.searchsorted(self.keys, keys),
+                              max(len(self.keys) - 1, 0))
+        found = valid & (self.keys[position] == keys) if len(
+            self.keys) else np.zeros(len(trips), dtype=bool)
+        distance = np.where(found,
+                            self.pairs["distance"].to_numpy()[position],
+                            np.nan)
+        return pd.Series(distance, index=trips.index, name="distance")